@@ -0,0 +1,249 @@
+"""Database-layer scaling benchmark.
+
+Grows a throwaway database through several scales of synthetic data
+and, at each scale, times every db service method, records the
+``EXPLAIN QUERY PLAN`` of each statement the method actually ran
+(captured with a trace callback) and fails if a hot-path statement
+does a full table scan. Results are written as JSON so runs can be
+compared:
+
+    python benchmarks/db_scaling.py --scales 1000,100000,1000000
+    python benchmarks/db_scaling.py --compare benchmarks/results/<older run>.json
+
+``--scales`` counts requests; clients, nuts and admins are derived from
+it (see ``row_counts``). The database defaults to ``bench_nuts.db`` so a
+live ``nuts.db`` is never touched unless passed explicitly with --db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# methods allowed to read a whole table; everything else is a hot path
+FULL_SCAN_ALLOWED = {'NutDbService.list', 'RequestDbService.list'}
+
+
+def row_counts(requests: int) -> dict:
+    return {
+        'admin': max(10, requests // 1000),
+        'nut': max(20, requests // 100),
+        'client': max(100, requests // 10),
+        'request': requests,
+    }
+
+
+def fill(db_path: str, target: dict):
+    """Top every table up to ``target`` rows with plain sqlite3 executemany."""
+    db = sqlite3.connect(db_path)
+    current = {table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in target}
+    rng = random.Random(target['request'])
+    with db:
+        db.executemany(
+            "INSERT INTO admin (name) VALUES (?)",
+            ((f"admin {i}",) for i in range(current['admin'], target['admin']))
+        )
+        db.executemany(
+            "INSERT INTO nut (name, packages) VALUES (?, ?)",
+            ((f"nut {i}", 10 ** 9) for i in range(current['nut'], target['nut']))
+        )
+        db.executemany(
+            "INSERT INTO client (name, credit) VALUES (?, ?)",
+            ((f"client {i}", rng.randint(0, 5000)) for i in range(current['client'], target['client']))
+        )
+        db.executemany(
+            "INSERT INTO request (admin_id, nut_id, packages, credit_paid, description, requester_id, approved, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    rng.randint(1, target['admin']),
+                    rng.randint(1, target['nut']),
+                    rng.randint(1, 20),
+                    rng.randint(0, 500),
+                    "synthetic",
+                    rng.randint(1, 10 ** 6),
+                    rng.choice((0, 1, 1, 1, -1)),
+                    "2025-01-01 00:00:00",
+                )
+                for _ in range(current['request'], target['request'])
+            )
+        )
+    db.execute("ANALYZE")
+    db.close()
+
+
+def statement_shape(sql: str) -> str:
+    """Traced SQL has its parameters inlined; put the placeholders back."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?\b", "?", sql)
+    return " ".join(sql.split())
+
+
+def explain(db_path: str, statements) -> list:
+    """EXPLAIN QUERY PLAN the first traced instance of every statement shape."""
+    shapes = {}
+    for sql in statements:
+        shapes.setdefault(statement_shape(sql), sql)
+    db = sqlite3.connect(db_path)
+    plans = []
+    for shape, sql in shapes.items():
+        rows = db.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        plans.append({'sql': shape, 'plan': [row[3] for row in rows]})
+    db.close()
+    return plans
+
+
+def full_scans(plans) -> list:
+    return [
+        detail for plan in plans for detail in plan['plan']
+        if detail.startswith('SCAN') and 'CONSTANT ROW' not in detail
+        # FTS5 reads its one-row config shadow table when a trigger writes the index
+        and not detail.endswith('_fts_config')
+    ]
+
+
+async def run(args) -> dict:
+    # must be set before utils.database builds its pool
+    os.environ['DB_NAME'] = args.db
+    sys.path.insert(0, ROOT)
+    from utils.database import (
+        init_db, close_db, AdminDbService, ClientDbService, NutDbService, RequestDbService
+    )
+    from utils.database.base import pool, writer
+
+    traced = []
+
+    def trace(sql):
+        # '-- TRIGGER name' lines mark trigger bodies running, not statements
+        if not sql.lstrip().upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA', '--')):
+            traced.append(sql)
+
+    if args.fresh and os.path.exists(args.db):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    await init_db()
+    await pool.set_trace_callback(trace)
+    await writer.set_trace_callback(trace)
+
+    clients = ClientDbService('client')
+    nuts = NutDbService('nut')
+    admins = AdminDbService('admin')
+    requests = RequestDbService('request')
+
+    results = {'started_at': datetime.now(timezone.utc).isoformat(), 'db': args.db, 'scales': []}
+    failed = False
+
+    for scale in args.scales:
+        counts = row_counts(scale)
+        started = time.perf_counter()
+        await asyncio.to_thread(fill, args.db, counts)
+        print(f"\n== {scale} requests {counts} (filled in {time.perf_counter() - started:.1f}s)")
+
+        rng = random.Random(scale)
+        client_ids = lambda: rng.randint(1, counts['client'])
+        request_ids = lambda: rng.randint(1, counts['request'])
+        seq = iter(range(10 ** 9))
+
+        methods = {
+            'ClientDbService.add': lambda: clients.add(name=f"bench {scale} {next(seq)}", credit=0),
+            'ClientDbService.get': lambda: clients.get(f"client {client_ids() - 1}"),
+            'ClientDbService.get_by_id': lambda: clients.get_by_id(client_ids()),
+            'ClientDbService.list_page': lambda: clients.list_page(client_ids()),
+            'ClientDbService.update_by_id': lambda: clients.update_by_id(client_ids(), credit=1),
+            'ClientDbService.update': lambda: clients.update(f"client {client_ids() - 1}", 1),
+            'AdminDbService.get': lambda: admins.get(f"admin {rng.randint(0, counts['admin'] - 1)}"),
+            'NutDbService.get_by_id': lambda: nuts.get_by_id(rng.randint(1, counts['nut'])),
+            'NutDbService.list': lambda: nuts.list(),
+            'RequestDbService.get_by_id': lambda: requests.get_by_id(request_ids()),
+            'RequestDbService.list_page': lambda: requests.list_page(request_ids()),
+            'RequestDbService.set_approved': lambda: requests.set_approved(request_ids(), True),
+        }
+        if counts['request'] <= args.full_list_max:
+            methods['RequestDbService.list'] = lambda: requests.list()
+
+        scale_result = {'requests': scale, 'rows': counts, 'methods': {}}
+        for name, call in methods.items():
+            repeat = 3 if name.endswith('.list') else args.repeat
+            traced.clear()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await call()
+                timings.append((time.perf_counter() - start) * 1e6)
+            timings.sort()
+            plans = explain(args.db, traced)
+            scans = [] if name in FULL_SCAN_ALLOWED else full_scans(plans)
+            failed = failed or bool(scans)
+            scale_result['methods'][name] = {
+                'repeat': repeat,
+                'mean_us': statistics.fmean(timings),
+                'p50_us': timings[len(timings) // 2],
+                'p95_us': timings[max(0, int(len(timings) * 0.95) - 1)],
+                'plans': plans,
+                'full_scans': scans,
+            }
+            flag = "  FULL SCAN: " + "; ".join(scans) if scans else ""
+            print(f"  {name:32} p50 {timings[len(timings) // 2]:10.1f} us  p95 {scale_result['methods'][name]['p95_us']:10.1f} us{flag}")
+        results['scales'].append(scale_result)
+
+    await close_db()
+    results['failed'] = failed
+    return results
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    before = {
+        (scale['requests'], name): method['p50_us']
+        for scale in previous['scales'] for name, method in scale['methods'].items()
+    }
+    print(f"\n== p50 compared with {previous_path}")
+    for scale in current['scales']:
+        for name, method in scale['methods'].items():
+            old = before.get((scale['requests'], name))
+            if old:
+                print(f"  {scale['requests']:>9} {name:32} {old:10.1f} -> {method['p50_us']:10.1f} us ({method['p50_us'] / old:5.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench_nuts.db')
+    parser.add_argument('--scales', default='1000,10000,100000', type=lambda s: sorted(int(x) for x in s.split(',')))
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--full-list-max', type=int, default=100000,
+                        help='only time the unbounded RequestDbService.list up to this many requests')
+    parser.add_argument('--keep', dest='fresh', action='store_false', help='reuse an existing --db instead of starting empty')
+    parser.add_argument('--out', default=None, help='JSON output path (default benchmarks/results/db_scaling_<utc time>.json)')
+    parser.add_argument('--compare', default=None, help='earlier JSON result to compare p50 timings against')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    out = args.out or os.path.join(
+        ROOT, 'benchmarks', 'results', f"db_scaling_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+    if results['failed']:
+        print("FAILED: full table scans in hot paths (see above)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
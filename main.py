@@ -1,78 +1,114 @@
-
+import time
+# cold start is measured from here, see startup_report()
+started = time.perf_counter()
 
 import asyncio
-from utils.database import init_db
-from telegram import Update,InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import Application, CommandHandler, ContextTypes,CallbackQueryHandler, ConversationHandler, MessageHandler, filters
-from utils.config import TOKEN
-from utils.ui_helper import (
-    button_handler,
-    help_cmd,
-    start
-)
-from utils.database import (
-    BaseDbService as AdminDbService,
-    ClientDbService,
-    NutDbService,
-    RequestDbService
-)
-from utils.command import (
-    ClientCommands,
-    AdminCommands,
-    NutCommands,
-    RequestCommands
+import secrets
+from utils.database import init_db, close_db, cache_stats, tenants
+from telegram.ext import Application
+from utils.config import (
+    TOKEN,
+    PERSISTENCE_INTERVAL,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    METRICS_FILE,
+    METRICS_INTERVAL,
+    LEDGER_SNAPSHOT_SECONDS,
+    BACKUP_INTERVAL
 )
+from utils.ui_helper import runtime_gauges
+from utils.update_processor import update_processor
+from utils.metrics import TimedRequest, export_periodically, startup_seconds, startup_report
+from utils.notifier import notifier
+from utils.persistence import SqlitePersistence
+from utils.command import registry
+from utils.services import services
 
-client_cmds = ClientCommands(ClientDbService('client'))
-admin_cmds = AdminCommands(AdminDbService('admin'))
-nut_cmds = NutCommands(NutDbService('nut'))
-request_cmds = RequestCommands(RequestDbService('request'))
+startup_seconds['imports'] = time.perf_counter() - started
 
-async def main():
-    await init_db()
+async def start_updater(app: Application):
+    """Receive updates by long polling or through the webhook listener (BOT_MODE)."""
+    if BOT_MODE != 'webhook':
+        await app.updater.start_polling()
+        return
 
-    app = Application.builder().token(TOKEN).build()
+    if not WEBHOOK_URL:
+        raise RuntimeError("BOT_MODE=webhook needs WEBHOOK_URL (the public https base url).")
+    # the listener rejects any POST that does not carry this secret
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    await app.updater.start_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+        secret_token=secret_token,
+    )
+    print(f"🌐 Webhook listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
 
-    app.add_handler(CommandHandler("start", start))
-
-    # Client commands
-    conv_handler = client_cmds.generate_add_conversation_handler()
-    app.add_handler(conv_handler)
-    app.add_handler(CommandHandler("list_clients", client_cmds.list_cmd))
-    # register the ConversationHandler returned by generate_update_conversation_handler()
-    app.add_handler(client_cmds.generate_update_conversation_handler())
-    # Nut commands
-    app.add_handler(nut_cmds.generate_add_conversation_handler())
-    app.add_handler(CommandHandler("list_nuts", nut_cmds.list_cmd))
-
-    # Admin commands
-    app.add_handler(admin_cmds.generate_add_conversation_handler())
-    app.add_handler(CommandHandler("list_admins", admin_cmds.list_cmd))
+async def timed_init_db():
+    start = time.perf_counter()
+    await init_db()
+    startup_seconds['init_db'] = time.perf_counter() - start
 
-    # Request commands
-    app.add_handler(request_cmds.generate_add_conversation_handler())
-    app.add_handler(CommandHandler("list_requests", request_cmds.list_cmd))
+async def main():
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        # same pool size as the default request, plus per-method latency metrics
+        .request(TimedRequest(connection_pool_size=256))
+        .concurrent_updates(update_processor)
+        .persistence(SqlitePersistence(update_interval=PERSISTENCE_INTERVAL))
+        .build()
+    )
 
-    # help commands: 
-    app.add_handler(CommandHandler('help',help_cmd))
+    # every command group declares its own handlers, callback routes and help
+    registry.register(*services.command_groups()).add_to(app)
+    # fill the report rollups of every database, the default one included, as it opens
+    tenants.on_open.append(services.report_cmds.backfill_if_needed)
 
-    app.add_handler(CallbackQueryHandler(button_handler))
+    # open the database while getMe is in flight; app.initialize() then
+    # finds the bot already initialized
+    await asyncio.gather(timed_init_db(), app.bot.initialize())
 
     # ---- Manual control ----
     await app.initialize()
     await app.start()
+    notifier.start(app.bot)
+    if METRICS_FILE:
+        exporter = asyncio.create_task(export_periodically(METRICS_FILE, METRICS_INTERVAL, runtime_gauges))
+    ledger_task = asyncio.create_task(services.client_cmds.ledger_maintenance(LEDGER_SNAPSHOT_SECONDS))
+    tenants_task = asyncio.create_task(tenants.close_idle_periodically())
+    if BACKUP_INTERVAL:
+        backup_task = asyncio.create_task(services.backup_cmds.backup_periodically(BACKUP_INTERVAL))
     print("🤖 Bot is running...")
 
     # Keeps the bot running forever until you stop it
-    await app.updater.start_polling()
+    await start_updater(app)
+    # the webhook is cleared (or set) and the first getUpdates is on its way
+    startup_seconds['first_poll'] = time.perf_counter() - started
+    print(startup_report())
     try:
         await asyncio.Future()  # run forever
     except KeyboardInterrupt:
         pass
     finally:
+        if METRICS_FILE:
+            exporter.cancel()
+        ledger_task.cancel()
+        tenants_task.cancel()
+        if BACKUP_INTERVAL:
+            backup_task.cancel()
         await app.updater.stop()
+        await notifier.stop()
         await app.stop()
         await app.shutdown()
+        services.export_cmds.shutdown()
+        await close_db()
+        print(f"📊 Lookup cache stats: {cache_stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""Local fake of Telegram's webhook delivery, for testing and measuring webhook mode.
+
+POSTs synthetic message updates to the bot's webhook listener with the
+secret-token header and reports latency and throughput:
+
+    python tools/fake_webhook.py --url http://127.0.0.1:8443/telegram --secret <WEBHOOK_SECRET>
+
+With --self-serve it starts python-telegram-bot's own webhook listener
+in-process through the public ``Updater.start_webhook`` API, with the Bot
+API calls it makes (getMe, setWebhook) answered locally, which measures
+the listener on its own.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from http import HTTPStatus
+
+import httpx
+from telegram.request import BaseRequest
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Fake"},
+            "text": "/list_nuts",
+        },
+    }
+
+
+class LocalBotApi(BaseRequest):
+    """Answers the bot's own Bot API calls without leaving the process."""
+
+    RESULTS = {
+        "getMe": {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_bot"},
+    }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        result = self.RESULTS.get(url.rsplit("/", 1)[-1], True)
+        return HTTPStatus.OK, json.dumps({"ok": True, "result": result}).encode()
+
+
+async def self_serve(port: int, path: str, secret: str):
+    """Run PTB's webhook listener locally; returns (updater, update_queue)."""
+    from telegram import Bot
+    from telegram.ext import Updater
+
+    queue = asyncio.Queue()
+    bot = Bot("123456:fake-token-for-local-testing", request=LocalBotApi(), get_updates_request=LocalBotApi())
+    updater = Updater(bot, queue)
+    await updater.initialize()
+    await updater.start_webhook(
+        listen="127.0.0.1",
+        port=port,
+        url_path=path,
+        webhook_url=f"http://127.0.0.1:{port}/{path}",
+        secret_token=secret,
+    )
+    return updater, queue
+
+
+async def run(url: str, secret: str, total: int, concurrency: int, chats: int):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+    latencies = []
+    next_id = iter(range(1, total + 1))
+
+    async with httpx.AsyncClient() as client:
+        # a wrong secret must be refused
+        bad = await client.post(url, json=make_update(0, 1), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+        print(f"wrong secret -> HTTP {bad.status_code}")
+
+        async def worker():
+            for update_id in next_id:
+                start = time.perf_counter()
+                response = await client.post(url, json=make_update(update_id, update_id % chats), headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{total} updates in {elapsed:.2f}s -> {total / elapsed:.0f} updates/s (concurrency {concurrency})")
+    print(
+        f"latency ms: p50={statistics.median(latencies) * 1000:.2f} "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} "
+        f"max={latencies[-1] * 1000:.2f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default="local-secret")
+    parser.add_argument("--total", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--self-serve", action="store_true")
+    args = parser.parse_args()
+
+    updater = queue = None
+    if args.self_serve:
+        url = httpx.URL(args.url)
+        updater, queue = await self_serve(url.port, url.path.strip("/"), args.secret)
+
+    await run(args.url, args.secret, args.total, args.concurrency, args.chats)
+
+    if updater:
+        print(f"updates queued by the listener: {queue.qsize()}")
+        await updater.stop()
+        await updater.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
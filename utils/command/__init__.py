@@ -2,3 +2,9 @@ from utils.command.client import ClientCommands
 from utils.command.nut import NutCommands
 from utils.command.admin import AdminCommands
 from utils.command.request import RequestCommands
+from utils.command.importer import ImportCommands
+from utils.command.inline import InlineCommands
+from utils.command.report import ReportCommands
+from utils.command.backup import BackupCommands
+from utils.command.export import ExportCommands
+from utils.command.registry import Registry, registry
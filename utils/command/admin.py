@@ -1,5 +1,5 @@
 from telegram import  Update
-from telegram.ext import ContextTypes,CallbackQueryHandler, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler
 from utils.command.base import BaseCommand
 from utils.database import AdminDbService
 from utils.config import MAIN_ADMIN_ID
@@ -22,6 +22,17 @@ class AdminCommands(BaseCommand):
         await self.db.add(name)
         await self.send_message(update,f"✅ Admin '{name}' added successfully.")
 
+    def register(self, registry):
+        registry.section("🧑‍💼 <b>Admin Commands</b>")
+        registry.handler(self.generate_add_conversation_handler())
+        registry.help("/add_admin <admin_name>", "Add a new admin")
+        registry.command("list_admins", self.list_cmd, help="View all admins")
+        registry.callback("add_admin", self.usage_callback("/add_admin <admin_name>"))
+        registry.callback("list_admins", self.list_cmd)
+        registry.button("🧑‍💼 Add Admin", "add_admin")
+        registry.button("📋 List Admins", "list_admins")
+        super().register(registry)
+
     def define_states(self):
         # only need the admin name
         self.NAME = 0
@@ -43,11 +54,10 @@ class AdminCommands(BaseCommand):
         await self.send_message(update, f"✅ Admin '{name}' added successfully.")
         return ConversationHandler.END
 
+    def format_row(self, row):
+        id, name = row
+        return f"{id}. {name}"
+
     async def list_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        admins = await self.db.list()
-        if not admins:
-            return await self.send_message(update, "No admins found.")
-        
-        text = "\n".join([f"{id}. {name}" for id, name in admins])
-        await self.send_message(update, text)
+        await self.send_page(update, "No admins found.")
         
\ No newline at end of file
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import os
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.config import MAIN_ADMIN_ID
+from utils.notifier import notifier
+
+logger = logging.getLogger(__name__)
+
+
+class BackupCommands:
+    """``/backup_now`` and the scheduled snapshots of every database (main admin only)."""
+
+    def __init__(self, backups):
+        self.backups = backups
+
+    def register(self, registry):
+        registry.section("💾 <b>Backups</b> (main admin)")
+        registry.command("backup_now", self.backup_now_cmd, help="Snapshot every database now")
+
+    @staticmethod
+    def format_results(results) -> str:
+        lines = [f"✅ Backed up {len(results)} database(s):"]
+        lines += [
+            f"• {os.path.basename(path)} — {size / 1024 / 1024:.1f} MB in {seconds:.1f}s"
+            for path, size, seconds in results
+        ]
+        return "\n".join(lines)
+
+    async def backup_now_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await update.message.reply_text("❌ Only the main admin can run backups.")
+        if self.backups.running:
+            return await update.message.reply_text("ℹ️ A backup is already running.")
+        await update.message.reply_text("⏳ Backing up…")
+        try:
+            results = await self.backups.backup_all()
+        except Exception as e:
+            logger.exception("Backup failed")
+            return await update.message.reply_text(f"❌ Backup failed: {e}")
+        await update.message.reply_text(self.format_results(results))
+
+    async def backup_periodically(self, interval: float):
+        """Snapshot every ``interval`` seconds; failures are reported to the main admin."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                results = await self.backups.backup_all()
+            except Exception as e:
+                logger.exception("Scheduled backup failed")
+                if MAIN_ADMIN_ID:
+                    notifier.enqueue(MAIN_ADMIN_ID, f"❌ Scheduled backup failed: {e}")
+                continue
+            logger.info("Backed up %d databases", len(results))
@@ -1,19 +1,15 @@
-import os
-import asyncio
 from abc import ABC, abstractmethod
-from telegram import Update,InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import Application, CommandHandler, ContextTypes,CallbackQueryHandler, ConversationHandler, MessageHandler, filters
+from telegram import Update,InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, ContextTypes, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
 from utils.config import (
-    TOKEN,
-    MAIN_ADMIN_ID
+    MAIN_ADMIN_ID,
+    VIEW_CACHE_SIZE
 )
 
-from utils.database import (
-    AdminDbService,
-    ClientDbService,
-    NutDbService,
-    RequestDbService
-)
+from utils.database import table_cache
+
+# rendered list pages, keyed by page and the write versions of their tables
+views = table_cache('views', VIEW_CACHE_SIZE)
 
 class BaseCommand(ABC):
     """Abstract base class for all bot command groups."""
@@ -21,15 +17,86 @@ class BaseCommand(ABC):
     def __init__(self, db_service):
         self.db = db_service
         self.model_name = db_service.table_name
+        # state -> handler for the suggestion buttons (pick:<model>:<id>) offered in that state
+        self.pick_states = {}
+        self.update_pick_states = {}
         self.define_states()
         self.states_keys = list(self.states.keys())
 
-    async def send_message(self, update: Update, text: str):
+    def register(self, registry):
+        """Declare this group's handlers, callback routes, help and start buttons.
+
+        Subclasses add their own entries and then call this for the shared
+        page navigation route.
+        """
+        registry.callback(f'page:{self.model_name}', self.list_cmd)
+
+    def usage_callback(self, usage: str):
+        """Callback that answers a button with the usage of its command."""
+        async def callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            await update.callback_query.edit_message_text(f"Use `{usage}`", parse_mode="Markdown")
+        return callback
+
+    async def send_message(self, update: Update, text: str, reply_markup=None):
         """Common helper to send messages safely."""
         if update.message:
-            await update.message.reply_text(text)
+            await update.message.reply_text(text, reply_markup=reply_markup)
         elif update.callback_query:
-            await update.callback_query.message.reply_text(text)
+            await update.callback_query.message.reply_text(text, reply_markup=reply_markup)
+
+    def page_keyboard(self, rows, has_prev: bool, has_next: bool):
+        """Prev/Next buttons whose callback data carries the keyset cursor."""
+        buttons = []
+        if has_prev:
+            buttons.append(InlineKeyboardButton('⬅️ Prev', callback_data=f'page:{self.model_name}:prev:{rows[0][0]}'))
+        if has_next:
+            buttons.append(InlineKeyboardButton('Next ➡️', callback_data=f'page:{self.model_name}:next:{rows[-1][0]}'))
+        return InlineKeyboardMarkup([buttons]) if buttons else None
+
+    def suggestion_keyboard(self, rows, model_name: str = None):
+        """One button per near-match found by ``search()``."""
+        model_name = model_name or self.model_name
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton(row[1], callback_data=f'pick:{model_name}:{row[0]}')]
+            for row in rows
+        ])
+
+    def format_row(self, row) -> str:
+        """One line of a list page; subclasses format their own columns."""
+        return " | ".join(str(value) for value in row)
+
+    async def send_page(self, update: Update, empty_text: str):
+        """Send (or, when navigating, edit in place) one page of ``self.db``.
+
+        Callback data has the form ``page:<model>:<next|prev>:<cursor>``.
+        Rendered pages are cached until a write to one of their tables.
+        """
+        query = update.callback_query
+        paging = bool(query and query.data and query.data.startswith('page:'))
+        direction, cursor = 'next', 0
+        if paging:
+            _, _, direction, cursor = query.data.split(':')
+            cursor = int(cursor)
+
+        # a version change makes the key miss, so a stale page is never served
+        key = (self.model_name, direction, cursor, self.db.version())
+        view = views.get(key)
+        if view is None:
+            generation = views.generation
+            rows, has_prev, has_next = await self.db.list_page(cursor, direction)
+            view = (
+                "\n".join([self.format_row(row) for row in rows]) if rows else None,
+                self.page_keyboard(rows, has_prev, has_next) if rows else None
+            )
+            views.set(key, view, generation)
+
+        text, reply_markup = view
+        if text is None:
+            return await self.send_message(update, empty_text)
+        if paging:
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        else:
+            await self.send_message(update, text, reply_markup=reply_markup)
 
     @abstractmethod
     async def add_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -78,18 +145,24 @@ class BaseCommand(ABC):
         await self.send_message(update, f"❌ Add {self.model_name} cancelled.")
         return ConversationHandler.END
     
+    def conversation_states(self, states: dict, pick_states: dict) -> dict:
+        return {
+            key: [MessageHandler(filters.TEXT & ~filters.COMMAND, callback)]
+                 + ([CallbackQueryHandler(pick_states[key], pattern='^pick:')] if key in pick_states else [])
+            for key, callback in states.items()
+        }
+
     def generate_add_conversation_handler(self):
         return ConversationHandler(
         entry_points=[
             CommandHandler(f'add_{self.model_name}', self.handle_add_command),
             CallbackQueryHandler(self.start_interactive, pattern=f'^add_{self.model_name}$')
         ],
-        states={
-            key:[MessageHandler(filters.TEXT & ~filters.COMMAND, callback)]
-            for key,callback in self.states.items()
-        },
+        states=self.conversation_states(self.states, self.pick_states),
         fallbacks=[CommandHandler('cancel', self.cancel)],
-        allow_reentry=True
+        allow_reentry=True,
+        name=f'add_{self.model_name}',
+        persistent=True
     )
 
     def generate_update_conversation_handler(self):
@@ -98,11 +171,10 @@ class BaseCommand(ABC):
             CommandHandler(f'update_credit', self.handle_update_command),
             CallbackQueryHandler(self.start_interactive, pattern=f'^update_credit$')
         ],
-        states={
-            key:[MessageHandler(filters.TEXT & ~filters.COMMAND, callback)]
-            for key,callback in self.update_states.items()
-        },
+        states=self.conversation_states(self.update_states, self.update_pick_states),
         fallbacks=[CommandHandler('cancel', self.cancel)],
-        allow_reentry=True
+        allow_reentry=True,
+        name='update_credit',
+        persistent=True
     )
 
@@ -1,12 +1,20 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
 from telegram import  Update
-from telegram.ext import ContextTypes,CallbackQueryHandler, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler
 from utils.command.base import BaseCommand
-from utils.database import ClientDbService
+from utils.config import MAIN_ADMIN_ID
+from utils.database import ClientDbService, LedgerDbService, tenants, tenant_scope
+from utils.notifier import notifier
+
+logger = logging.getLogger(__name__)
 
 
 class ClientCommands(BaseCommand):
-    def __init__(self, client_db:ClientDbService):
+    def __init__(self, client_db:ClientDbService, ledger_db:LedgerDbService):
         super().__init__(client_db)
+        self.ledger = ledger_db
         
     async def add_cmd(self, update, context):
         if len(context.args) < 1:
@@ -17,6 +25,25 @@ class ClientCommands(BaseCommand):
         await self.db.add(name=name, credit=credit)
         await self.send_message(update, f"✅ Client '{name}' added with credit {credit}.")
 
+    def register(self, registry):
+        registry.section("👤 <b>Client Commands</b>")
+        registry.handler(self.generate_add_conversation_handler())
+        registry.help("/add_client <name> [credit]", "Add a new client (optional starting credit)")
+        registry.command("list_clients", self.list_cmd, help="View all clients")
+        registry.handler(self.generate_update_conversation_handler())
+        registry.help("/update_credit <client_name> <amount>", "Update a client's credit balance")
+        registry.command("statement", self.statement_cmd, "<client_name> [YYYY-MM-DD]",
+                         "Credit changes since a date (default: last 30 days)")
+        registry.command("verify_ledger", self.verify_ledger_cmd,
+                         help="Check every balance against the credit ledger (main admin)")
+        registry.callback("add_client", self.usage_callback("/add_client <name> [credit]"))
+        registry.callback("list_clients", self.list_cmd)
+        registry.callback("update_credit", self.usage_callback("/update_credit <client_name> <amount>"))
+        registry.button("➕ Add Client", "add_client")
+        registry.button("📋 List Clients", "list_clients")
+        registry.button("💸 Update Credit", "update_credit")
+        super().register(registry)
+
     def define_states(self):
         self.NAME, self.CREDIT = range(2)
         self.states = {
@@ -25,9 +52,12 @@ class ClientCommands(BaseCommand):
         }
 
         self.update_states = {
-            self.NAME:self.receive_name,
+            self.NAME:self.receive_update_name,
             self.CREDIT:self.receive_credit_update
         }
+        self.update_pick_states = {
+            self.NAME:self.receive_client_pick
+        }
 
     async def receive_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Receive the client's name and prompt for credit."""
@@ -65,13 +95,12 @@ class ClientCommands(BaseCommand):
         context.user_data.pop('new_client_name', None)
         return ConversationHandler.END
 
+    def format_row(self, row):
+        id, name, credit = row
+        return f"{id}. {name} — 💰 {credit}"
+
     async def list_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        clients = await self.db.list()
-        if not clients:
-            return await self.send_message(update, "No clients found.")
-        
-        text = "\n".join([f"{id}. {name} — 💰 {credit}" for id, name, credit in clients])
-        await self.send_message(update, text)
+        await self.send_page(update, "No clients found.")
 
     async def update_cmd(self,update: Update, context: ContextTypes.DEFAULT_TYPE):
         if len(context.args) < 2:
@@ -81,12 +110,51 @@ class ClientCommands(BaseCommand):
         amount = float(context.args[1])
         client = await self.db.get(name)
         if not client:
-            return await self.send_message(update,"Client not found.")
+            matches = await self.db.search(name)
+            hint = f" Did you mean: {', '.join(row[1] for row in matches)}?" if matches else ""
+            return await self.send_message(update,f"Client not found.{hint}")
         
-        await self.db.update(client[0], amount)
+        await self.db.update(client[1], amount)
         await self.send_message(update,f"✅ Updated {name}'s credit by {amount:+}. New total: {client[2] + amount}")
 
 
+    async def receive_update_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Receive the name of an existing client, offering near-matches on a miss."""
+        if not update.message or not update.message.text:
+            await self.send_message(update, "❌ Invalid name. Please send the client's name as text.")
+            return self.NAME
+
+        name = update.message.text.strip()
+        client = await self.db.get(name)
+        if not client:
+            matches = await self.db.search(name)
+            if not matches:
+                await update.message.reply_text(f"❌ No client matches '{name}'. Send another name or /cancel.")
+            else:
+                await update.message.reply_text(
+                    f"🔎 No client named '{name}'. Did you mean:",
+                    reply_markup=self.suggestion_keyboard(matches)
+                )
+            return self.NAME
+
+        context.user_data['new_client_name'] = client[1]
+        await update.message.reply_text("Please enter the amount to add (negative to subtract):")
+        return self.CREDIT
+
+    async def receive_client_pick(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """A suggested client was chosen (callback data pick:client:<id>)."""
+        query = update.callback_query
+        await query.answer()
+        client = await self.db.get_by_id(int(query.data.split(':')[2]))
+        if not client:
+            await query.edit_message_text("❌ That client no longer exists. Send another name or /cancel.")
+            return self.NAME
+
+        context.user_data['new_client_name'] = client[1]
+        await query.edit_message_text(f"👤 {client[1]} — 💰 {client[2]}")
+        await query.message.reply_text("Please enter the amount to add (negative to subtract):")
+        return self.CREDIT
+
     async def receive_credit_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Receive credit amount, validate, create client and finish conversation."""
         if not update.message or not update.message.text:
@@ -106,8 +174,71 @@ class ClientCommands(BaseCommand):
             return ConversationHandler.END
 
         await self.db.update(name=name, credit=credit)
-        await update.message.reply_text(f"✅ Client '{name}' added with credit {credit}.")
+        await update.message.reply_text(f"✅ Updated {name}'s credit by {credit:+}.")
 
         # cleanup
         context.user_data.pop('new_client_name', None)
-        return ConversationHandler.END
\ No newline at end of file
+        return ConversationHandler.END
+
+    async def statement_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/statement <client_name> [YYYY-MM-DD]: credit changes since the date (default: 30 days)."""
+        args = list(context.args or [])
+        since = datetime.now(timezone.utc) - timedelta(days=30)
+        if args:
+            try:
+                since = datetime.strptime(args[-1], '%Y-%m-%d')
+                args.pop()
+            except ValueError:
+                pass
+        if not args:
+            return await self.send_message(update, "Usage: /statement <client_name> [YYYY-MM-DD]")
+
+        name = " ".join(args)
+        client = await self.db.get(name)
+        if not client:
+            return await self.send_message(update, "Client not found.")
+
+        since = since.strftime('%Y-%m-%d 00:00:00')
+        opening, entries = await self.ledger.statement(client[0], since)
+        lines = [f"📒 {client[1]} since {since[:10]}", f"Opening balance: {opening}"]
+        lines += [f"{created_at} {amount:+} {reason}" for _, amount, reason, created_at in entries]
+        lines.append(f"Current balance: {client[2]}")
+        await self.send_message(update, "\n".join(lines))
+
+    async def verify_ledger_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/verify_ledger: recompute every balance from the ledger (main admin)."""
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await self.send_message(update, "❌ Only the main admin can verify the ledger.")
+        drift = await self.ledger.verify()
+        await self.send_message(update, self.format_drift(drift) if drift else "✅ Every client balance matches its ledger.")
+
+    @staticmethod
+    def format_drift(drift, tenant: str = '') -> str:
+        shop = f" in {tenant}" if tenant else ""
+        lines = [f"⚠️ {len(drift)} client balances{shop} differ from the ledger:"]
+        lines += [f"{name}: credit {credit}, ledger {total}" for _, name, credit, total in drift[:20]]
+        return "\n".join(lines)
+
+    async def ledger_maintenance(self, interval: float):
+        """Every ``interval`` seconds: snapshot changed balances, then check for drift.
+
+        Covers the tenants open at the time; a closed tenant has had no
+        writes for a while and is snapshotted once it is back in use.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for tenant in tenants.names():
+                with tenant_scope(tenant):
+                    await self.check_ledger(tenant)
+
+    async def check_ledger(self, tenant: str = ''):
+        try:
+            await self.ledger.take_snapshots()
+            drift = await self.ledger.verify()
+        except Exception:
+            logger.exception("Ledger maintenance failed")
+            return
+        if drift:
+            logger.warning("%d client balances differ from the ledger", len(drift))
+            if MAIN_ADMIN_ID:
+                notifier.enqueue(MAIN_ADMIN_ID, self.format_drift(drift, tenant))
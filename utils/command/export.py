@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.config import MAIN_ADMIN_ID, EXPORT_WORKERS, EXPORT_CHUNK_ROWS
+from utils import export_files
+
+logger = logging.getLogger(__name__)
+
+EXPORT_USAGE = "Usage: /export <requests|clients|nuts> [csv|xlsx]"
+# bots may send documents up to 50 MB
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+
+class ExportCommands:
+    """``/export``: a whole table as a CSV or XLSX document (main admin only).
+
+    Rows are read in keyset pages of EXPORT_CHUNK_ROWS and each page is
+    written by a worker process while the next one is read, so memory
+    stays at about two pages and the event loop only ever fetches rows.
+    """
+
+    def __init__(self, sources: dict):
+        # export name -> db service
+        self.sources = sources
+        self._workers = None
+
+    def register(self, registry):
+        registry.section("📤 <b>Export</b> (main admin)")
+        registry.command("export", self.export_cmd, "<requests|clients|nuts> [csv|xlsx]",
+                         "Send a whole table as a CSV or XLSX file")
+
+    @property
+    def workers(self) -> ProcessPoolExecutor:
+        # started on the first export; spawned so they hold no copy of the bot's threads or connections
+        if self._workers is None:
+            self._workers = ProcessPoolExecutor(EXPORT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return self._workers
+
+    def shutdown(self):
+        if self._workers is not None:
+            self._workers.shutdown(cancel_futures=True)
+            self._workers = None
+
+    async def export(self, name: str, fmt: str) -> tuple:
+        """Write the ``name`` table to a temp file; returns (path, rows)."""
+        db = self.sources[name]
+        loop = asyncio.get_running_loop()
+        fd, path = tempfile.mkstemp(prefix=f"{name}-", suffix='.part')
+        os.close(fd)
+        try:
+            header = await db.column_names()
+            pending = loop.run_in_executor(self.workers, export_files.append_rows, path, fmt, [header], 1)
+            count = 0
+            async for rows in db.iter_pages(EXPORT_CHUNK_ROWS):
+                # one page in the worker while the next one is read
+                await pending
+                pending = loop.run_in_executor(self.workers, export_files.append_rows, path, fmt, rows, count + 2)
+                count += len(rows)
+            await pending
+            return await loop.run_in_executor(
+                self.workers, export_files.finish, path, fmt, name, MAX_DOCUMENT_BYTES
+            ), count
+        except BaseException:
+            os.remove(path)
+            raise
+
+    async def export_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await update.message.reply_text("❌ Only the main admin can export data.")
+        args = [arg.lower() for arg in context.args or []]
+        name = args[0] if args else ''
+        fmt = args[1] if len(args) > 1 else 'csv'
+        if name not in self.sources or fmt not in ('csv', 'xlsx'):
+            return await update.message.reply_text(EXPORT_USAGE)
+
+        await update.message.reply_text(f"⏳ Exporting {name}…")
+        try:
+            path, count = await self.export(name, fmt)
+        except Exception as e:
+            logger.exception("Export of %s failed", name)
+            return await update.message.reply_text(f"❌ Export failed: {e}")
+        try:
+            if os.path.getsize(path) > MAX_DOCUMENT_BYTES:
+                return await update.message.reply_text(
+                    f"❌ The {name} export is {os.path.getsize(path) / 1024 / 1024:.0f} MB, "
+                    f"over Telegram's {MAX_DOCUMENT_BYTES // 1024 // 1024} MB limit for bots."
+                )
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%d')
+            filename = f"{name}-{stamp}.{fmt}" + ('.gz' if path.endswith('.gz') else '')
+            with open(path, 'rb') as document:
+                await update.message.reply_document(
+                    document, filename=filename, caption=f"📤 {count} {name}"
+                )
+        finally:
+            os.remove(path)
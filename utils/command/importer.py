@@ -0,0 +1,239 @@
+import asyncio
+import csv
+import json
+import math
+import os
+import tempfile
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, MessageHandler, filters
+from utils.config import MAIN_ADMIN_ID, IMPORT_CHUNK_ROWS
+
+# importable tables: column -> parser, the unique ``name`` first
+IMPORT_COLUMNS = {
+    'client': {'name': str, 'credit': float},
+    'nut': {'name': str, 'packages': int},
+}
+MAX_REPORTED_ERRORS = 20
+# Telegram refuses bot downloads of larger files
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+
+
+def parse_value(column: str, kind, value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f"missing {column}")
+    if kind is str:
+        return str(value).strip()
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{column} must be a number, got {value!r}")
+    if not math.isfinite(number):
+        raise ValueError(f"{column} must be a number, got {value!r}")
+    if kind is int:
+        if not number.is_integer() or number < 0:
+            raise ValueError(f"{column} must be a whole number ≥ 0, got {value!r}")
+        return int(number)
+    return number
+
+
+def iter_json_array(f, read_size: int = 64 * 1024):
+    """Yield the elements of the JSON array in ``f`` one at a time."""
+    decoder = json.JSONDecoder()
+    buffer, eof, position = "", False, 0
+
+    def fill():
+        nonlocal buffer, eof, position
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def skip(separators: str):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in separators:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    skip(" \t\r\n")
+    if buffer[position:position + 1] != "[":
+        raise ValueError("a .json document must hold an array of objects")
+    position += 1
+    while True:
+        skip(" \t\r\n,")
+        if position >= len(buffer):
+            raise ValueError("the JSON array is not closed")
+        if buffer[position] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # a number may go on in the next chunk
+            fill()
+            continue
+        position = end
+        yield value
+
+
+def iter_records(path: str, file_name: str):
+    """Yield (line number, dict or JSONDecodeError) from a CSV, JSON array or JSON Lines file.
+
+    Every format is read one record at a time. A JSON Lines line that is
+    not valid JSON is yielded as its error; in a JSON array the rest of
+    the array cannot be found after one, so it ends the file.
+    """
+    extension = os.path.splitext(file_name.lower())[1]
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if extension == '.csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        elif extension in ('.jsonl', '.ndjson'):
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_number, e
+        elif extension == '.json':
+            records = iter_json_array(f)
+            index = 0
+            while True:
+                index += 1
+                try:
+                    record = next(records)
+                except StopIteration:
+                    return
+                except json.JSONDecodeError as e:
+                    yield index, json.JSONDecodeError(f"{e.msg}; the rest of the array was skipped", e.doc, e.pos)
+                    return
+                yield index, record
+        else:
+            raise ValueError("unsupported file type, send a .csv, .json or .jsonl document")
+
+
+def parse_chunks(path: str, file_name: str, columns: dict, chunk_rows: int, max_errors: int = MAX_REPORTED_ERRORS):
+    """Validate records; yield ({name: row tuple}, [(line, error)], rejected count) per ``chunk_rows`` valid rows.
+
+    Only the first ``max_errors`` rejections of the file are kept, the
+    rest are just counted. A name that appears twice keeps its last row,
+    like running the import twice would.
+    """
+    rows, rejected, rejected_count, kept = {}, [], 0, 0
+    for line_number, record in iter_records(path, file_name):
+        if isinstance(record, json.JSONDecodeError):
+            error = f"invalid JSON: {record.msg}"
+        elif not isinstance(record, dict):
+            error = "not an object"
+        else:
+            try:
+                row = tuple(parse_value(column, kind, record.get(column)) for column, kind in columns.items())
+            except ValueError as e:
+                error = str(e)
+            else:
+                rows[row[0]] = row
+                if len(rows) >= chunk_rows:
+                    yield rows, rejected, rejected_count
+                    rows, rejected, rejected_count = {}, [], 0
+                continue
+        rejected_count += 1
+        if kept < max_errors:
+            rejected.append((line_number, error))
+            kept += 1
+    if rows or rejected_count:
+        yield rows, rejected, rejected_count
+
+
+class ImportCommands:
+    """Bulk import of clients or nuts from an uploaded document (main admin only).
+
+    The caption (or, failing that, the file name) says which table:
+    ``clients.csv`` or a document captioned ``nut``. Files are parsed in
+    a worker thread and upserted by name IMPORT_CHUNK_ROWS rows per write
+    job, so other chats keep being served while a large file is imported.
+    """
+
+    def __init__(self, services: dict):
+        self.services = services
+
+    def register(self, registry):
+        registry.handler(MessageHandler(filters.Document.ALL, self.import_document))
+        registry.section("📥 <b>Bulk Import</b> (main admin)")
+        registry.help(
+            "Send a <code>.csv</code>, <code>.json</code> or <code>.jsonl</code> document captioned "
+            "<code>client</code> (columns name, credit) or <code>nut</code> (columns name, packages)",
+            "rows are added or updated by name",
+            code=False
+        )
+
+    def target(self, caption: str, file_name: str):
+        for text in (caption or '', file_name or ''):
+            word = text.strip().lstrip('/').lower().replace('import', '').strip(' _-')
+            for table in IMPORT_COLUMNS:
+                if word.startswith(table):
+                    return table
+        return None
+
+    async def import_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await message.reply_text("❌ Only the main admin can import data.")
+
+        document = message.document
+        table = self.target(message.caption, document.file_name)
+        if table is None:
+            return await message.reply_text(
+                "❌ Caption the document with 'client' or 'nut' (or name it clients.csv / nuts.json)."
+            )
+        columns = IMPORT_COLUMNS[table]
+
+        if document.file_size and document.file_size > MAX_DOWNLOAD_BYTES:
+            return await message.reply_text(
+                f"❌ {document.file_name} is {document.file_size / 1024 / 1024:.1f} MB; "
+                f"bots can only download files up to {MAX_DOWNLOAD_BYTES // 1024 // 1024} MB. Split it and send the parts."
+            )
+
+        inserted = updated = rejected_count = 0
+        rejected = []
+        fd, path = tempfile.mkstemp(prefix='import-')
+        os.close(fd)
+        try:
+            try:
+                file = await document.get_file()
+                await file.download_to_drive(path)
+            except TelegramError as e:
+                return await message.reply_text(f"❌ Could not download {document.file_name}: {e.message}")
+            chunks = parse_chunks(path, document.file_name or '', columns, IMPORT_CHUNK_ROWS)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.to_thread(next, chunks, None)
+                    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                        done = f" ({inserted + updated} rows were imported before that)" if inserted + updated else ""
+                        return await message.reply_text(f"❌ Could not read {document.file_name}: {e}{done}")
+                    if chunk is None:
+                        break
+                    rows, chunk_rejected, chunk_rejected_count = chunk
+                    # each chunk is its own write job, other writes go in between
+                    added, changed = await self.services[table].upsert_many(list(columns), list(rows.values()))
+                    inserted, updated = inserted + added, updated + changed
+                    rejected_count += chunk_rejected_count
+                    rejected += chunk_rejected
+            finally:
+                chunks.close()
+        finally:
+            os.remove(path)
+
+        lines = [f"📥 Imported {table}s from {document.file_name}: ✅ {inserted} inserted, 🔁 {updated} updated, ❌ {rejected_count} rejected"]
+        for line_number, error in rejected:
+            lines.append(f"line {line_number}: {error}")
+        if rejected_count > len(rejected):
+            lines.append(f"… and {rejected_count - len(rejected)} more")
+        await message.reply_text("\n".join(lines))
@@ -0,0 +1,72 @@
+import asyncio
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes, InlineQueryHandler
+from utils.database import LookupCache, table_versions
+from utils.config import MAIN_ADMIN_ID, INLINE_CACHE_TTL, INLINE_RESULTS
+
+
+class InlineCommands:
+    """``@bot <name>``: nut stock and client credit straight from the chat input.
+
+    Both name indexes are searched concurrently (see BaseDbService.search)
+    and the answer for each query text is kept for INLINE_CACHE_TTL
+    seconds, or until a nut or client is written, so the prefixes a user
+    types in a row mostly hit the cache. Only admins get results.
+    """
+
+    def __init__(self, nuts_db, clients_db, admins_db):
+        self.nuts_db = nuts_db
+        self.clients_db = clients_db
+        self.admins_db = admins_db
+        self.results = LookupCache(maxsize=1024, ttl=INLINE_CACHE_TTL)
+
+    def register(self, registry):
+        # inline mode must be enabled for the bot with BotFather's /setinline
+        registry.handler(InlineQueryHandler(self.inline_query))
+        registry.section("🔎 <b>Inline Lookup</b> (admins)")
+        registry.help(
+            "Type <code>@&lt;bot&gt; almonds</code> in any chat",
+            "matching nuts with their stock and clients with their credit",
+            code=False
+        )
+
+    async def is_admin(self, user) -> bool:
+        if str(user.id) == str(MAIN_ADMIN_ID):
+            return True
+        return await self.admins_db.get(user.full_name) is not None
+
+    async def search(self, text: str) -> list:
+        key = (text.lower(), table_versions('nut', 'client'))
+        results = self.results.get(key)
+        if results is None:
+            generation = self.results.generation
+            nuts, clients = await asyncio.gather(
+                self.nuts_db.search(text, INLINE_RESULTS),
+                self.clients_db.search(text, INLINE_RESULTS)
+            )
+            results = [
+                InlineQueryResultArticle(
+                    id=f"nut:{id}",
+                    title=f"🥜 {name}",
+                    description=f"📦 {packages} packages",
+                    input_message_content=InputTextMessageContent(f"🥜 {name}: 📦 {packages} packages")
+                )
+                for id, name, packages in nuts
+            ] + [
+                InlineQueryResultArticle(
+                    id=f"client:{id}",
+                    title=f"👤 {name}",
+                    description=f"💰 {credit}",
+                    input_message_content=InputTextMessageContent(f"👤 {name}: 💰 {credit}")
+                )
+                for id, name, credit in clients
+            ]
+            self.results.set(key, results, generation)
+        return results
+
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.inline_query
+        text = query.query.strip()
+        if not text or not await self.is_admin(query.from_user):
+            return await query.answer([], cache_time=INLINE_CACHE_TTL, is_personal=True)
+        await query.answer(await self.search(text), cache_time=INLINE_CACHE_TTL, is_personal=True)
@@ -1,5 +1,5 @@
 from telegram import  Update
-from telegram.ext import ContextTypes,CallbackQueryHandler, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler
 from utils.command.base import BaseCommand
 from utils.database import NutDbService
 
@@ -17,6 +17,17 @@ class NutCommands(BaseCommand):
         await self.db.add(name=name, packages=packages)
         await self.send_message(update, f"🥜 Nut '{name}' added with {packages} packages.")
 
+    def register(self, registry):
+        registry.section("🥜 <b>Nut Commands</b>")
+        registry.handler(self.generate_add_conversation_handler())
+        registry.help("/add_nut <nut_name> [packages]", "Add a new type of nut (optional package count)")
+        registry.command("list_nuts", self.list_cmd, help="View all nut types")
+        registry.callback("add_nut", self.usage_callback("/add_nut <nut_name> [packages]"))
+        registry.callback("list_nuts", self.list_cmd)
+        registry.button("🥜 Add Nut", "add_nut")
+        registry.button("📦 List Nuts", "list_nuts")
+        super().register(registry)
+
     def define_states(self):
         # states: ask for nut name, then packages
         self.NAME, self.PACKAGES = range(2)
@@ -57,10 +68,9 @@ class NutCommands(BaseCommand):
         context.user_data.pop('new_nut_name', None)
         return ConversationHandler.END
 
+    def format_row(self, row):
+        id, name, packages = row
+        return f"{id}. {name} — 📦 {packages} packages"
+
     async def list_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        nuts = await self.db.list()
-        if not nuts:
-            return await self.send_message(update, "No nuts found.")
-        
-        text = "\n".join([f"{id}. {name} — 📦 {packages} packages" for id, name, packages in nuts])
-        await self.send_message(update, text)
\ No newline at end of file
+        await self.send_page(update, "No nuts found.")
\ No newline at end of file
@@ -0,0 +1,141 @@
+import re
+from html import escape
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler
+from utils import metrics
+
+
+class Registry:
+    """Commands, callback routes, help entries and start buttons of every command group.
+
+    Each group declares its own in ``register(registry)``. Callback data
+    is resolved with at most three dict lookups: the whole string, then
+    its first two ``:``-separated parts (``page:client``), then its first
+    part (``request``), so routing cost does not grow with the number of
+    groups. Help text and the start keyboard are built once, on first use.
+    """
+
+    HELP_HEADER = "<b>🧭 Available Commands</b>"
+    HELP_FOOTER = (
+        "💡 <b>Example Usage:</b>\n"
+        "• <code>/add_client John 500</code> — Adds a client named John with 500 credit"
+    )
+    BUTTONS_PER_ROW = 2
+
+    def __init__(self):
+        self.handlers = []
+        self.routes = {}
+        # route callbacks that answer the query themselves
+        self.self_answering = set()
+        self.sections = {}
+        self.buttons = []
+        self._section = None
+        self._help_html = None
+        self._keyboard = None
+
+    def register(self, *groups):
+        for group in groups:
+            group.register(self)
+        return self
+
+    def section(self, title: str):
+        """Help section that the following entries belong to."""
+        self._section = title
+        self.sections.setdefault(title, [])
+
+    def help(self, usage: str, text: str, code: bool = True):
+        usage = f"<code>{escape(usage)}</code>" if code else usage
+        self.sections[self._section].append(f"• {usage} — {text}")
+        self._help_html = None
+
+    def handler(self, handler):
+        """Any telegram.ext handler, added in registration order."""
+        self.handlers.append(handler)
+
+    def command(self, name: str, callback, usage: str = "", help: str = None):
+        self.handlers.append(CommandHandler(name, callback))
+        if help:
+            self.help(f"/{name} {usage}".strip(), help)
+
+    def callback(self, route: str, callback, answers: bool = False):
+        """Route callback data equal to ``route``, or starting with ``route:``.
+
+        With ``answers`` the callback answers the query itself (a query
+        can only be answered once, e.g. to show a toast).
+        """
+        self.routes[route] = callback
+        if answers:
+            self.self_answering.add(callback)
+
+    def button(self, label: str, data: str):
+        """Button on the /start keyboard."""
+        self.buttons.append(InlineKeyboardButton(label, callback_data=data))
+        self._keyboard = None
+
+    def resolve(self, data: str):
+        callback = self.routes.get(data)
+        if callback is None:
+            parts = data.split(':', 2)
+            callback = self.routes.get(':'.join(parts[:2])) or self.routes.get(parts[0])
+        return callback
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        callback = self.resolve(query.data or '')
+        if callback not in self.self_answering:
+            await query.answer()
+        if callback is not None:
+            await callback(update, context)
+
+    def help_html(self) -> str:
+        if self._help_html is None:
+            parts = [self.HELP_HEADER]
+            parts += [f"{title}\n" + "\n".join(lines) for title, lines in self.sections.items() if lines]
+            parts.append(self.HELP_FOOTER)
+            self._help_html = "\n" + "\n\n".join(parts) + "\n"
+        return self._help_html
+
+    def start_keyboard(self) -> InlineKeyboardMarkup:
+        if self._keyboard is None:
+            self._keyboard = InlineKeyboardMarkup([
+                self.buttons[i:i + self.BUTTONS_PER_ROW]
+                for i in range(0, len(self.buttons), self.BUTTONS_PER_ROW)
+            ])
+        return self._keyboard
+
+    @staticmethod
+    def _flatten(handlers):
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                yield from Registry._flatten(handler.entry_points)
+                for state_handlers in handler.states.values():
+                    yield from Registry._flatten(state_handlers)
+                yield from Registry._flatten(handler.fallbacks)
+            else:
+                yield handler
+
+    def known_names(self) -> tuple:
+        """(command names, first callback data parts) handled by the registered handlers."""
+        commands, callbacks = set(), {route.split(':')[0] for route in self.routes}
+        for handler in self._flatten(self.handlers):
+            if isinstance(handler, CommandHandler):
+                commands.update(handler.commands)
+            elif isinstance(handler, CallbackQueryHandler) and handler.pattern is not None:
+                pattern = getattr(handler.pattern, 'pattern', handler.pattern)
+                prefix = re.match(r'\^(\w+)', pattern) if isinstance(pattern, str) else None
+                if prefix:
+                    callbacks.add(prefix.group(1))
+        return commands, callbacks
+
+    def add_to(self, app):
+        """Add every registered handler to ``app``, callback routing last."""
+        for handler in self.handlers:
+            app.add_handler(handler)
+        app.add_handler(CallbackQueryHandler(self.dispatch))
+        # metrics label updates by these names only
+        commands, callbacks = self.known_names()
+        metrics.known_commands.update(commands)
+        metrics.known_callbacks.update(callbacks)
+
+
+registry = Registry()
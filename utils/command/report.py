@@ -0,0 +1,88 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.config import MAIN_ADMIN_ID
+
+logger = logging.getLogger(__name__)
+
+REPORT_USAGE = (
+    "Usage: /report nuts [days] — packages approved per nut per day (default 7 days)\n"
+    "       /report admins [weeks] — credit collected per admin per week (default 4 weeks)"
+)
+# stay under Telegram's 4096 character message limit
+MAX_REPORT_CHARS = 3800
+
+
+class ReportCommands:
+    """Stock-movement and sales reports, read from the daily rollups (main admin only)."""
+
+    def __init__(self, report_db):
+        self.db = report_db
+
+    def register(self, registry):
+        registry.section("📊 <b>Reports</b> (main admin)")
+        registry.command("report", self.report_cmd)
+        registry.help("/report nuts [days]", "Packages approved per nut per day")
+        registry.help("/report admins [weeks]", "Credit collected per admin per week")
+        registry.command("rebuild_reports", self.rebuild_reports_cmd,
+                         help="Rebuild the report tables from request history")
+
+    async def report_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await update.message.reply_text("❌ Only the main admin can see reports.")
+
+        args = context.args or []
+        kind = args[0].lower() if args else ''
+        try:
+            span = int(args[1]) if len(args) > 1 else None
+        except ValueError:
+            return await update.message.reply_text(REPORT_USAGE)
+        today = datetime.now(timezone.utc).date()
+
+        if kind == 'nuts':
+            days = span or 7
+            rows = await self.db.nuts_by_day((today - timedelta(days=days - 1)).isoformat())
+            title = f"📊 Packages approved per nut, last {days} days"
+        elif kind == 'admins':
+            weeks = span or 4
+            # whole weeks, starting on the Monday of the oldest one
+            since = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+            rows = await self.db.admins_by_week(since.isoformat())
+            title = f"📊 Credit collected per admin, last {weeks} weeks"
+        else:
+            return await update.message.reply_text(REPORT_USAGE)
+
+        if not rows:
+            return await update.message.reply_text(f"{title}\n\nNo approved requests in this period.")
+        lines, period = [title], None
+        for key, name, total, requests in rows:
+            if key != period:
+                period = key
+                lines.append(f"\n{period}")
+            lines.append(f"• {name} — {total:g} ({requests} requests)")
+        text = "\n".join(lines)
+        if len(text) > MAX_REPORT_CHARS:
+            text = text[:MAX_REPORT_CHARS].rsplit("\n", 1)[0] + "\n…"
+        await update.message.reply_text(text)
+
+    async def rebuild_reports_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await update.message.reply_text("❌ Only the main admin can rebuild reports.")
+        await update.message.reply_text("⏳ Rebuilding report rollups from request history…")
+        start = time.perf_counter()
+        counted = await self.db.backfill()
+        await update.message.reply_text(
+            f"✅ Rollups rebuilt from {counted} approved requests in {time.perf_counter() - start:.1f}s."
+        )
+
+    async def backfill_if_needed(self):
+        """Fill the current tenant's rollups when history exists but they are empty.
+
+        Runs as each tenant database is opened (TenantManager.on_open).
+        """
+        if await self.db.needs_backfill():
+            start = time.perf_counter()
+            counted = await self.db.backfill()
+            logger.info("Backfilled report rollups from %d requests in %.1fs", counted, time.perf_counter() - start)
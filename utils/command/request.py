@@ -1,18 +1,32 @@
+import re
 from telegram import  Update
-from telegram.ext import ContextTypes,CallbackQueryHandler, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from utils.command.base import BaseCommand
-from utils.database import ClientDbService,NutDbService,AdminDbService,RequestDbService
+from utils.database import (
+    NutDbService,
+    AdminDbService,
+    RequestDbService,
+    APPROVED,
+    RequestNotFound,
+    RequestAlreadyDecided,
+    InsufficientStock,
+    InvalidPackages,
+    current_tenant,
+    tag,
+    untag
+)
+from utils.notifier import notifier, split_message
 from utils.config import MAIN_ADMIN_ID
 
 
 class RequestCommands(BaseCommand):
 
-    def __init__(self,request_db:RequestDbService):
+    def __init__(self,request_db:RequestDbService,nuts_db:NutDbService,admins_db:AdminDbService):
         super().__init__(request_db)
-        self.nuts_db = NutDbService('nut')
+        self.nuts_db = nuts_db
         # Admins DB used to validate the admin making the request
-        self.admins_db = AdminDbService('admin')
+        self.admins_db = admins_db
 
     async def add_cmd(self,update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -37,6 +51,8 @@ class RequestCommands(BaseCommand):
             packages = int(context.args[1])
         except ValueError:
             return await self.send_message(update,"❌ Invalid packages value. Use an integer.")
+        if packages <= 0:
+            return await self.send_message(update,"❌ Packages must be a positive integer.")
         try:
             credit_paid = float(context.args[2])
         except ValueError:
@@ -47,7 +63,9 @@ class RequestCommands(BaseCommand):
         # Ensure nut exists
         nut = await self.nuts_db.get(nut_name)
         if not nut:
-            return await self.send_message(update,"❌ Nut not found. Add it first with /add_nut.")
+            matches = await self.nuts_db.search(nut_name)
+            hint = f" Did you mean: {', '.join(row[1] for row in matches)}?" if matches else ""
+            return await self.send_message(update,f"❌ Nut not found.{hint} Add it first with /add_nut.")
 
         # Insert request as pending (approved=0) and notify MAIN_ADMIN_ID with approval buttons
         request_id = await self.db.add(
@@ -60,27 +78,52 @@ class RequestCommands(BaseCommand):
             approved=0,
         )
 
-        
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton('✅ Approve', callback_data=f'request:approve:{request_id}'),
-            InlineKeyboardButton('❌ Reject', callback_data=f'request:reject:{request_id}')
-        ]])
-
-        if MAIN_ADMIN_ID:
-            await context.bot.send_message(
-                chat_id=MAIN_ADMIN_ID,
-                text=(
-                    f"📩 New request from {admin_name}\n"
-                    f"Nut: {nut_name}\n"
-                    f"Packages: {packages}\n"
-                    f"Credit Paid: {credit_paid}\n"
-                    f"Note: {description or '-'}"
-                ),
-                reply_markup=kb
-            )
+        self.notify_main_admin(request_id, admin_name, nut_name, packages, credit_paid, description)
 
         await self.send_message(update, "✅ Your request has been recorded and is pending approval.")
 
+    def register(self, registry):
+        registry.section("📦 <b>Request Commands</b>")
+        registry.handler(self.generate_add_conversation_handler())
+        registry.help("/add_request <nut_name> <packages> <credit_paid> [description]", "Record a new request")
+        registry.command("list_requests", self.list_cmd, help="View all requests")
+        registry.command("bulk_approve", self.bulk_approve_cmd, "[nut=<nut_name>] [admin=<admin_name>] [upto=<id>]",
+                         "Approve matching pending requests (main admin)")
+        registry.command("bulk_reject", self.bulk_reject_cmd, "[nut=<nut_name>] [admin=<admin_name>] [upto=<id>]",
+                         "Reject matching pending requests (main admin)")
+        registry.callback("add_request", self.usage_callback("/add_request <nut_name> <packages> <credit_paid> [description]"))
+        registry.callback("list_requests", self.list_cmd)
+        # approve/reject buttons: request:<approve|reject>:<id>
+        registry.callback("request", self.handle_request_decision, answers=True)
+        registry.button(" Add Request", "add_request")
+        registry.button("📜 List Requests", "list_requests")
+        super().register(registry)
+
+    def notify_main_admin(self, request_id, admin_name, nut_name, packages, credit_paid, description):
+        """Queue the approval prompt for MAIN_ADMIN_ID (merged into digests when enabled)."""
+        if not MAIN_ADMIN_ID:
+            return
+        # ids on the buttons keep them unambiguous when prompts are merged, and
+        # the tenant tag sends the decision to the shop the request belongs to
+        tenant = current_tenant.get()
+        shop = f" ({tenant})" if tenant else ""
+        kb = InlineKeyboardMarkup([[
+            InlineKeyboardButton(f'✅ Approve #{request_id}{shop}', callback_data=tag(f'request:approve:{request_id}')),
+            InlineKeyboardButton(f'❌ Reject #{request_id}{shop}', callback_data=tag(f'request:reject:{request_id}'))
+        ]])
+        notifier.enqueue(
+            MAIN_ADMIN_ID,
+            (
+                f"📩 New request #{request_id}{shop} from {admin_name}\n"
+                f"Nut: {nut_name}\n"
+                f"Packages: {packages}\n"
+                f"Credit Paid: {credit_paid}\n"
+                f"Note: {description or '-'}"
+            ),
+            reply_markup=kb,
+            digest=True
+        )
+
     def define_states(self):
         # states: nut name, packages, credit_paid, description
         self.NUT_NAME, self.PACKAGES, self.CREDIT_PAID, self.DESCRIPTION = range(4)
@@ -90,6 +133,9 @@ class RequestCommands(BaseCommand):
             self.CREDIT_PAID: self.receive_credit_paid,
             self.DESCRIPTION: self.receive_description
         }
+        self.pick_states = {
+            self.NUT_NAME: self.receive_nut_pick
+        }
 
     async def start_interactive_add(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Verify user is a predefined admin before starting the request flow
@@ -106,10 +152,37 @@ class RequestCommands(BaseCommand):
             return self.NUT_NAME
 
         nut_name = update.message.text.strip()
-        context.user_data['new_request_nut_name'] = nut_name
+        nut = await self.nuts_db.get(nut_name)
+        if not nut:
+            # offer the closest names instead of failing at the end of the flow
+            matches = await self.nuts_db.search(nut_name)
+            if not matches:
+                await update.message.reply_text(f"❌ No nut matches '{nut_name}'. Send another name or /cancel.")
+            else:
+                await update.message.reply_text(
+                    f"🔎 No nut named '{nut_name}'. Did you mean:",
+                    reply_markup=self.suggestion_keyboard(matches, 'nut')
+                )
+            return self.NUT_NAME
+
+        context.user_data['new_request_nut_name'] = nut[1]
         await update.message.reply_text("Please enter number of packages (integer):")
         return self.PACKAGES
 
+    async def receive_nut_pick(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """A suggested nut was chosen (callback data pick:nut:<id>)."""
+        query = update.callback_query
+        await query.answer()
+        nut = await self.nuts_db.get_by_id(int(query.data.split(':')[2]))
+        if not nut:
+            await query.edit_message_text("❌ That nut no longer exists. Send another name or /cancel.")
+            return self.NUT_NAME
+
+        context.user_data['new_request_nut_name'] = nut[1]
+        await query.edit_message_text(f"🥜 {nut[1]}")
+        await query.message.reply_text("Please enter number of packages (integer):")
+        return self.PACKAGES
+
     async def receive_packages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not update.message or not update.message.text:
             await self.send_message(update, "❌ Invalid packages. Please send an integer.")
@@ -120,6 +193,9 @@ class RequestCommands(BaseCommand):
         except ValueError:
             await update.message.reply_text("❌ Invalid number. Please enter an integer for packages:")
             return self.PACKAGES
+        if packages <= 0:
+            await update.message.reply_text("❌ Packages must be positive. Please enter an integer above 0:")
+            return self.PACKAGES
 
         context.user_data['new_request_packages'] = packages
         await update.message.reply_text("Please enter credit paid (number):")
@@ -170,24 +246,7 @@ class RequestCommands(BaseCommand):
             requester_id=update.effective_user.id,
         )
 
-        
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton('✅ Approve', callback_data=f'request:approve:{request_id}'),
-            InlineKeyboardButton('❌ Reject', callback_data=f'request:reject:{request_id}')
-        ]])
-
-        if MAIN_ADMIN_ID:
-            await context.bot.send_message(
-                chat_id=MAIN_ADMIN_ID,
-                text=(
-                    f"📩 New request from {admin_name}\n"
-                    f"Nut: {nut_name}\n"
-                    f"Packages: {packages}\n"
-                    f"Credit Paid: {credit_paid}\n"
-                    f"Note: {description or '-'}"
-                ),
-                reply_markup=kb
-            )
+        self.notify_main_admin(request_id, admin_name, nut_name, packages, credit_paid, description)
 
         await self.send_message(update, f"✅ Request recorded by {admin_name} and is pending approval.")
 
@@ -196,76 +255,166 @@ class RequestCommands(BaseCommand):
             context.user_data.pop(k, None)
         return ConversationHandler.END
 
+    def format_row(self, row):
+        id, admin, nut, packages, credit_paid, description, _, _ = row
+        return f"{id}. 👤 {admin} | 🥜 {nut} | 📦 {packages} | 💰 {credit_paid} | 📝 {description or '-'}"
+
     async def list_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        requests = await self.db.list()
-        if not requests:
-            return await self.send_message(update,"No requests found.")
-        text = "\n".join([
-            f"{id}. 👤 {admin} | 🥜 {nut} | 📦 {packages} | 💰 {credit_paid} | 📝 {description or '-'}"
-            for id, admin, nut, packages, credit_paid, description,_,_ in requests
-        ])
-        await self.send_message(update,text)
+        await self.send_page(update, "No requests found.")
 
     async def handle_request_decision(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle approve/reject callbacks from the main admin."""
+        """Handle approve/reject callbacks from the main admin.
+
+        The query is answered exactly once, with a toast when the tap
+        changes nothing (a duplicate or invalid button), so the message
+        keeps the outcome written by the first tap.
+        """
         query = update.callback_query
-        await query.answer()
-        data = query.data  # format: request:approve:<id> or request:reject:<id>
+        toast = None
+        try:
+            toast = await self.decide_from_button(update, query)
+        finally:
+            await query.answer(toast)
+
+    async def decide_from_button(self, update: Update, query) -> str:
+        """Apply the decision on the tapped button; returns a toast text or None."""
+        # format: request:approve:<id> or request:reject:<id>, plus @<tenant> outside the default one
+        data, _ = untag(query.data)
 
         parts = data.split(":")
-        if len(parts) != 3:
-            await query.edit_message_text("❌ Invalid action.")
-            return
+        if len(parts) != 3 or parts[1] not in ('approve', 'reject'):
+            return "❌ Invalid action."
 
         action, req_id_str = parts[1], parts[2]
         try:
             req_id = int(req_id_str)
         except ValueError:
-            await query.edit_message_text("❌ Invalid request id.")
-            return
+            return "❌ Invalid request id."
 
-        # fetch request row
-        req_row = await self.db.get_by_id(req_id)
-        if not req_row:
-            await query.edit_message_text("⚠️ This request was not found.")
+        # the decision is applied atomically by the db service, which also
+        # refuses requests that were already decided; duplicate taps share
+        # one decision and only its first caller notifies anyone
+        try:
+            req_row = await self.db.decide(req_id, approve=(action == 'approve'))
+        except RequestNotFound:
+            await self.show_outcome(query, req_id, f"⚠️ Request #{req_id} was not found.")
+            return
+        except RequestAlreadyDecided as e:
+            # the outcome recorded by the first tap; its message stays as it is
+            return f"ℹ️ Request #{req_id} was already {'approved' if e.approved == APPROVED else 'rejected'}."
+        except InvalidPackages as e:
+            await query.message.reply_text(f"❌ Request #{req_id} asks for {e.packages} packages and cannot be approved; reject it instead.")
+            return
+        except InsufficientStock as e:
+            # keep the buttons so the request can be approved after restocking
+            await query.message.reply_text(
+                f"❌ Not enough stock to approve request #{req_id}: {e.requested} packages requested, {e.available} available."
+            )
             return
 
-        # BaseDbService.get_by_id returns full row; columns are: id, admin_id, nut_id, packages, credit_paid, description, requester_id, approved
+        # columns are: id, admin_id, nut_id, packages, credit_paid, description, requester_id, approved
         _, admin_id, nut_id, packages, credit_paid, description, requester_id, approved = req_row
 
         # resolve names for messages
-        admin = await self.admins_db.get_by_id(admin_id) if hasattr(self.admins_db, 'get_by_id') else None
-        nut = await self.nuts_db.get_by_id(nut_id) if hasattr(self.nuts_db, 'get_by_id') else None
-        admin_name = admin[1] if admin else 'Unknown'
+        nut = await self.nuts_db.get_by_id(nut_id)
         nut_name = nut[1] if nut else 'Unknown'
 
         # use stored requester_id (telegram chat id) to notify requester
         requester_chat_id = requester_id
 
         if action == 'approve':
-            # set approved flag
-            if hasattr(self.db, 'set_approved'):
-                await self.db.set_approved(req_id, True)
-            else:
-                await self.db.update_by_id(req_id, approved=1)
-
-            await query.edit_message_text(f"✅ Request approved by {update.effective_user.full_name} — {packages} × {nut_name} (paid: {credit_paid}).")
+            await self.show_outcome(query, req_id, f"✅ Request #{req_id} approved by {update.effective_user.full_name} — {packages} × {nut_name} (paid: {credit_paid}).")
             # notify requester
-            try:
-                await context.bot.send_message(chat_id=requester_chat_id, text=f"✅ Your request for {packages} × {nut_name} was approved.")
-            except Exception:
-                pass
+            notifier.enqueue(requester_chat_id, f"✅ Your request for {packages} × {nut_name} was approved.")
         else:
-            # rejected: set approved to 0 explicitly and notify
-            if hasattr(self.db, 'set_approved'):
-                await self.db.set_approved(req_id, False)
-            else:
-                await self.db.update_by_id(req_id, approved=0)
-
-            await query.edit_message_text(f"❌ Request rejected by {update.effective_user.full_name}.")
+            await self.show_outcome(query, req_id, f"❌ Request #{req_id} rejected by {update.effective_user.full_name}.")
+            notifier.enqueue(requester_chat_id, f"❌ Your request for {packages} × {nut_name} was rejected.")
+
+    @staticmethod
+    def other_prompt_rows(query, req_id: int) -> list:
+        """Button rows of the other requests' prompts merged into the same digest message."""
+        markup = query.message.reply_markup if query.message else None
+        if markup is None:
+            return []
+        own = (f"request:approve:{req_id}", f"request:reject:{req_id}")
+        return [
+            row for row in markup.inline_keyboard
+            if not any(untag(button.callback_data or '')[0] in own for button in row)
+        ]
+
+    async def show_outcome(self, query, req_id: int, text: str):
+        """Replace the prompt of ``req_id`` with ``text``.
+
+        In a digest only that request's buttons are removed and the outcome
+        is sent as a reply, so the other prompts stay decidable.
+        """
+        rows = self.other_prompt_rows(query, req_id)
+        if not rows:
+            await query.edit_message_text(text)
+            return
+        await query.edit_message_reply_markup(InlineKeyboardMarkup(rows))
+        await query.message.reply_text(text)
+
+    BULK_USAGE = (
+        "Usage: /bulk_approve [nut=<nut_name>] [admin=<admin_name>] [upto=<request_id>]\n"
+        "       /bulk_reject [nut=<nut_name>] [admin=<admin_name>] [upto=<request_id>]"
+    )
+
+    async def bulk_approve_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.bulk_decide(update, context, approve=True)
+
+    async def bulk_reject_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.bulk_decide(update, context, approve=False)
+
+    async def bulk_decide(self, update: Update, context: ContextTypes.DEFAULT_TYPE, approve: bool):
+        """Approve/reject all pending requests matching nut=, admin= and upto= filters."""
+        if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+            return await self.send_message(update, "❌ Only the main admin can decide requests.")
+
+        # names may contain spaces, so split on the "key=" markers
+        parts = re.split(r'\s*\b(nut|admin|upto)=', " ".join(context.args or []))
+        if parts[0].strip() or len(parts) < 3:
+            return await self.send_message(update, self.BULK_USAGE)
+        criteria = {key: value.strip() for key, value in zip(parts[1::2], parts[2::2])}
+
+        nut_id = admin_id = max_id = None
+        if 'nut' in criteria:
+            nut = await self.nuts_db.get(criteria['nut'])
+            if not nut:
+                return await self.send_message(update, "❌ Nut not found.")
+            nut_id = nut[0]
+        if 'admin' in criteria:
+            admin = await self.admins_db.get(criteria['admin'])
+            if not admin:
+                return await self.send_message(update, "❌ Admin not found.")
+            admin_id = admin[0]
+        if 'upto' in criteria:
             try:
-                await context.bot.send_message(chat_id=requester_chat_id, text=f"❌ Your request for {packages} × {nut_name} was rejected.")
-            except Exception:
-                pass
-
-
+                max_id = int(criteria['upto'])
+            except ValueError:
+                return await self.send_message(update, "❌ Invalid request id for upto=.")
+
+        decided, skipped = await self.db.decide_many(approve, nut_id=nut_id, admin_id=admin_id, max_id=max_id)
+
+        verb = "approved" if approve else "rejected"
+        text = f"{'✅' if approve else '❌'} {len(decided)} request(s) {verb}."
+        if skipped:
+            text += f"\n⚠️ {len(skipped)} left pending (not enough stock or no packages): " + ", ".join(f"#{row[0]}" for row in skipped[:50])
+            if len(skipped) > 50:
+                text += ", …"
+        await self.send_message(update, text)
+        await self.notify_requesters(decided, verb)
+
+    async def notify_requesters(self, rows, verb: str):
+        """Send each requester their decided requests, in as few messages as fit."""
+        by_requester = {}
+        for _, _, nut_id, packages, _, _, requester_id, _ in rows:
+            if requester_id is None:
+                continue
+            nut = await self.nuts_db.get_by_id(nut_id)
+            by_requester.setdefault(requester_id, []).append(f"• {packages} × {nut[1] if nut else 'Unknown'}")
+
+        # the notifier spreads these out under Telegram's rate limits
+        for chat_id, lines in by_requester.items():
+            for text in split_message(f"Your requests were {verb}:", lines):
+                notifier.enqueue(chat_id, text)
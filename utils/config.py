@@ -1,4 +1,83 @@
-import os 
+import os
 TOKEN = os.environ.get('TOKEN')
 MAIN_ADMIN_ID = os.environ.get('MAIN_ADMIN_ID')
 
+# database
+DB_NAME = os.environ.get('DB_NAME', 'nuts.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+DB_WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', 64))
+# extra time a batch waits for more writes; 0 batches whatever queued during the last commit
+DB_WRITE_BATCH_DELAY_MS = float(os.environ.get('DB_WRITE_BATCH_DELAY_MS', 0))
+LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', 1024))
+# seconds, 0 keeps entries until the next write
+LOOKUP_CACHE_TTL = float(os.environ.get('LOOKUP_CACHE_TTL', 0))
+# decided requests remembered, so repeated approve/reject taps skip the database
+DECISION_CACHE_SIZE = int(os.environ.get('DECISION_CACHE_SIZE', 4096))
+
+# tenants: one database file per shop. TENANTS maps chat or user ids to a shop,
+# e.g. "downtown:-1001234,-1005678;airport:-1009999,555123"; anything unmapped uses DB_NAME.
+# The main admin decides a shop's requests from the buttons it sends, and manages
+# its nuts, clients and admins from inside one of the shop's chats.
+TENANTS = os.environ.get('TENANTS', '')
+# 1 also gives every unmapped group chat a database of its own (chat_<id>)
+TENANT_PER_CHAT = os.environ.get('TENANT_PER_CHAT', '0') == '1'
+TENANT_DB_DIR = os.environ.get('TENANT_DB_DIR', 'tenants')
+# tenant databases open at once (least recently used idle ones are closed first), seconds before an idle one is closed
+TENANT_MAX_OPEN = int(os.environ.get('TENANT_MAX_OPEN', 32))
+TENANT_IDLE_SECONDS = float(os.environ.get('TENANT_IDLE_SECONDS', 600))
+
+# backups: a snapshot of every database file in BACKUP_DIR every BACKUP_INTERVAL seconds
+# (0 = only on /backup_now), the newest BACKUP_KEEP kept per database, gzipped when BACKUP_COMPRESS=1
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL = float(os.environ.get('BACKUP_INTERVAL', 86400))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+BACKUP_COMPRESS = os.environ.get('BACKUP_COMPRESS', '0') == '1'
+# pages copied per backup step and milliseconds between steps, so a backup never holds up the bot
+BACKUP_STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES', 64))
+BACKUP_STEP_SLEEP_MS = float(os.environ.get('BACKUP_STEP_SLEEP_MS', 5))
+
+# seconds between credit ledger snapshots (each run also checks balances for drift)
+LEDGER_SNAPSHOT_SECONDS = float(os.environ.get('LEDGER_SNAPSHOT_SECONDS', 3600))
+
+# bot
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 20))
+# rendered list pages kept in memory; an entry is only reused until its tables change
+VIEW_CACHE_SIZE = int(os.environ.get('VIEW_CACHE_SIZE', 256))
+# inline mode (@bot <name>): results per table, seconds an answer is reused
+INLINE_RESULTS = int(os.environ.get('INLINE_RESULTS', 10))
+INLINE_CACHE_TTL = float(os.environ.get('INLINE_CACHE_TTL', 10))
+
+# /export: worker processes writing the files, rows read and handed over per chunk
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 1))
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 2000))
+# bulk import: valid rows upserted per write job
+IMPORT_CHUNK_ROWS = int(os.environ.get('IMPORT_CHUNK_ROWS', 1000))
+
+# handlers running at once; updates from the same chat always run in order
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', 16))
+
+# outbound messages: messages/second overall and per chat, retries per message
+NOTIFY_GLOBAL_RATE = float(os.environ.get('NOTIFY_GLOBAL_RATE', 25))
+NOTIFY_CHAT_RATE = float(os.environ.get('NOTIFY_CHAT_RATE', 1))
+NOTIFY_MAX_RETRIES = int(os.environ.get('NOTIFY_MAX_RETRIES', 5))
+# merge "new request" notifications to the main admin sent within this many seconds (0 = off)
+NOTIFY_DIGEST_SECONDS = float(os.environ.get('NOTIFY_DIGEST_SECONDS', 0))
+
+# seconds between writes of conversation state and user_data to the database
+PERSISTENCE_INTERVAL = float(os.environ.get('PERSISTENCE_INTERVAL', 5))
+
+# updates: 'polling' (default) or 'webhook'
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+# public https base url Telegram should POST to, e.g. https://bot.example.com
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+# sent back by Telegram in X-Telegram-Bot-Api-Secret-Token; random per start when unset
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+
+# metrics: statements slower than this (ms) are logged; Prometheus text file rewritten every METRICS_INTERVAL s (unset = off)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_INTERVAL = float(os.environ.get('METRICS_INTERVAL', 15))
@@ -1,5 +1,11 @@
-from utils.database.base import BaseDbService,init_db
+from utils.database.base import BaseDbService,init_db,close_db,tenants
+from utils.database.tenant import DEFAULT_TENANT,current_tenant,tenant_scope,tag,untag
 from utils.database.client import ClientDbService
 from utils.database.nut import NutDbService
 from utils.database.admin import AdminDbService
-from utils.database.request import RequestDbService
+from utils.database.request import RequestDbService,PENDING,APPROVED,REJECTED
+from utils.database.ledger import LedgerDbService
+from utils.database.report import ReportDbService
+from utils.database.errors import DecisionError,RequestNotFound,RequestAlreadyDecided,InsufficientStock,InvalidPackages,BackupFailed
+from utils.database.backup import BackupService
+from utils.database.cache import LookupCache,table_cache,table_versions,cache_stats
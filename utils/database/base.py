@@ -1,56 +1,111 @@
 from abc import abstractmethod
-import aiosqlite
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from utils.config import (
+    DB_NAME,
+    DB_POOL_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_WRITE_BATCH_SIZE,
+    DB_WRITE_BATCH_DELAY_MS,
+    LIST_PAGE_SIZE,
+    TENANTS,
+    TENANT_PER_CHAT,
+    TENANT_DB_DIR,
+    TENANT_MAX_OPEN,
+    TENANT_IDLE_SECONDS
+)
+from .tenant import DEFAULT_TENANT, TenantManager, TenantPool, TenantWriter, parse_tenants
+from .cache import LookupCache, invalidate, table_versions
+from .migrations import migrate
 
-DB_NAME = "nuts.db"
+def timestamp() -> str:
+    # same format as sqlite's CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+async def create_schema(db):
+    """Create the tables of a fresh database and apply pending migrations."""
+    # Create clients table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS client (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            credit REAL DEFAULT 0
+        )
+    """)
+
+    # Create admins table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS admin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+
+    # Create nuts table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS nut (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            packages INTEGER DEFAULT 0
+        )
+    """)
+
+    # Create requests table (references both client and admin)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS request (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            nut_id INTEGER NOT NULL,
+            packages INTEGER NOT NULL,
+            credit_paid REAL DEFAULT 0,
+            description TEXT,
+            requester_id INTEGER,
+            approved INTEGER DEFAULT 0,
+            FOREIGN KEY (admin_id) REFERENCES admin(id),
+            FOREIGN KEY (nut_id) REFERENCES nut(id)
+        )
+    """)
+    await db.commit()
+    await migrate(db)
+
+# one database file per tenant, each with its own connection pool and a
+# single writer that batches commits; opened on first use, see tenant.py
+tenants = TenantManager(
+    create_schema,
+    DB_NAME,
+    TENANT_DB_DIR,
+    members=parse_tenants(TENANTS),
+    per_chat=TENANT_PER_CHAT,
+    max_open=TENANT_MAX_OPEN,
+    idle_seconds=TENANT_IDLE_SECONDS,
+    pool_options={'size': DB_POOL_SIZE, 'busy_timeout': DB_BUSY_TIMEOUT_MS},
+    writer_options={'max_batch': DB_WRITE_BATCH_SIZE, 'max_delay': DB_WRITE_BATCH_DELAY_MS / 1000}
+)
+# the pool and writer of the tenant whose update is being handled
+pool = TenantPool(tenants)
+writer = TenantWriter(tenants)
 
 async def init_db():
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Create clients table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS client (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                credit REAL DEFAULT 0
-            )
-        """)
+    # the default tenant; the others are opened when their first update arrives
+    await tenants.get(DEFAULT_TENANT)
 
-        # Create admins table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS admin (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL
-            )
-        """)
-
-        # Create nuts table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS nut (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                packages INTEGER DEFAULT 0
-            )
-        """)
-
-        # Create requests table (references both client and admin)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS request (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admin_id INTEGER NOT NULL,
-                nut_id INTEGER NOT NULL,
-                packages INTEGER NOT NULL,
-                credit_paid REAL DEFAULT 0,
-                description TEXT,
-                requester_id INTEGER,
-                approved INTEGER DEFAULT 0,
-                FOREIGN KEY (admin_id) REFERENCES admin(id),
-                FOREIGN KEY (nut_id) REFERENCES nut(id)
-            )
-        """)
-        await db.commit()
+async def close_db():
+    await tenants.close_all()
 
 class BaseDbService :
-    def __init__(self,table_name:str):
+    def __init__(self,table_name:str,cache:LookupCache=None):
         self.table_name = table_name
+        # optional read-through cache for get()/get_by_id(), see cache.table_cache()
+        self.cache = cache
+        # tables whose rows appear in list pages, see version()
+        self.view_tables = (table_name,)
+
+    def invalidate(self):
+        invalidate(self.table_name)
+
+    def version(self) -> tuple:
+        """Write versions of the tables behind list pages; changes on any mutation."""
+        return table_versions(*self.view_tables)
 
     def get_add_query(self,**kwargs) -> str :
         keys = kwargs.keys()
@@ -58,31 +113,139 @@ class BaseDbService :
         return f"INSERT OR IGNORE INTO {self.table_name} ({','.join(keys)}) VALUES ({','.join('?'*keys_length)})"
 
     async def add(self,**kwargs):
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute(
-                self.get_add_query(**kwargs),
-                list(kwargs.values())
-            )
-            await db.commit()
-            return cursor.lastrowid
+        row_id = await writer.execute(
+            self.get_add_query(**kwargs),
+            list(kwargs.values())
+        )
+        self.invalidate()
+        return row_id
+
+    async def upsert_many(self, columns: list, rows: list, chunk_size: int = 500):
+        """Insert or update ``rows`` by their unique name in one write job.
+
+        ``columns`` starts with ``name``; every row is a tuple in that
+        order. Returns (inserted, updated).
+        """
+        updates = ",".join(f"{column}=excluded.{column}" for column in columns[1:])
+        sql = (
+            f"INSERT INTO {self.table_name} ({','.join(columns)}) VALUES ({','.join('?' * len(columns))}) "
+            + (f"ON CONFLICT(name) DO UPDATE SET {updates}" if updates else "ON CONFLICT(name) DO NOTHING")
+        )
+
+        async def job(db):
+            existing = {}
+            for i in range(0, len(rows), chunk_size):
+                names = [row[0] for row in rows[i:i + chunk_size]]
+                cursor = await db.execute(
+                    f"SELECT * FROM {self.table_name} WHERE name IN ({','.join('?' * len(names))})",
+                    names
+                )
+                existing.update((row[1], row) for row in await cursor.fetchall())
+            await db.executemany(sql, rows)
+            await self.after_upsert(db, columns, rows, existing)
+            return len(rows) - len(existing), len(existing)
+
+        if not rows:
+            return 0, 0
+        result = await writer.run(job, f"{type(self).__name__}.upsert_many")
+        self.invalidate()
+        return result
+
+    async def after_upsert(self, db, columns: list, rows: list, existing: dict):
+        """Hook run inside the upsert_many job; ``existing`` maps name -> row before it."""
+        pass
 
     async def list(self):
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute(f"SELECT * FROM {self.table_name}")
-            return await cursor.fetchall()
+        return await pool.fetchall(f"SELECT * FROM {self.table_name}")
         
+    def get_page_query(self, before: bool) -> str:
+        if before:
+            return f"SELECT * FROM {self.table_name} WHERE id < ? ORDER BY id DESC LIMIT ?"
+        return f"SELECT * FROM {self.table_name} WHERE id > ? ORDER BY id LIMIT ?"
+
+    async def list_page(self, cursor: int = 0, direction: str = 'next', limit: int = LIST_PAGE_SIZE):
+        """Return one keyset page as (rows, has_prev, has_next).
+
+        ``cursor`` is the id the page starts after ('next') or ends before
+        ('prev'), so every page costs one index range scan of ``limit`` rows.
+        """
+        before = direction == 'prev'
+        rows = await pool.fetchall(self.get_page_query(before), (cursor, limit + 1))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+            return rows, has_more, True
+        return rows, cursor > 0, has_more
+
+    async def column_names(self) -> list:
+        """Names of the columns list_page() and iter_pages() return."""
+        async with pool.acquire() as db:
+            cursor = await db.execute(self.get_page_query(False), (0, 0))
+            return [column[0] for column in cursor.description]
+
+    async def iter_pages(self, chunk_size: int = 1000):
+        """Every row in id order, as keyset pages of at most ``chunk_size`` rows."""
+        cursor = 0
+        while True:
+            rows = await pool.fetchall(self.get_page_query(False), (cursor, chunk_size))
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            cursor = rows[-1][0]
+
     async def get(self,name:str):
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute(f"SELECT * FROM {self.table_name} WHERE name=?", (name,))
-            return await cursor.fetchone()
+        if self.cache is None:
+            return await pool.fetchone(f"SELECT * FROM {self.table_name} WHERE name=?", (name,))
+        row = self.cache.get(('name', name))
+        if row is None:
+            generation = self.cache.generation
+            row = await pool.fetchone(f"SELECT * FROM {self.table_name} WHERE name=?", (name,))
+            self.cache.set(('name', name), row, generation)
+            if row is not None:
+                self.cache.set(('id', row[0]), row, generation)
+        return row
+
+    async def search(self, query: str, limit: int = 5):
+        """Rows whose name is closest to ``query``, best match first.
+
+        Needs the ``<table>_name_fts`` trigram index (client and nut). The
+        index returns names sharing the most trigrams with ``query``, so a
+        typo still finds its row; those candidates are then re-ranked by
+        similarity. Queries shorter than a trigram match name prefixes.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if len(query) < 3:
+            return await pool.fetchall(
+                f"SELECT * FROM {self.table_name} WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+                (query, query + '\U0010ffff', limit)
+            )
+        folded = query.lower()
+        trigrams = {folded[i:i + 3] for i in range(len(folded) - 2)}
+        match = " OR ".join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams)
+        fts = f"{self.table_name}_name_fts"
+        rows = await pool.fetchall(
+            f"SELECT {self.table_name}.* FROM {fts} JOIN {self.table_name} ON {self.table_name}.id = {fts}.rowid "
+            f"WHERE {fts} MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit * 4)
+        )
+        rows.sort(key=lambda row: SequenceMatcher(None, folded, row[1].lower()).ratio(), reverse=True)
+        return rows[:limit]
 
     async def get_by_id(self, row_id: int):
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute(f"SELECT * FROM {self.table_name} WHERE id=?", (row_id,))
-            return await cursor.fetchone()
+        if self.cache is None:
+            return await pool.fetchone(f"SELECT * FROM {self.table_name} WHERE id=?", (row_id,))
+        row = self.cache.get(('id', row_id))
+        if row is None:
+            generation = self.cache.generation
+            row = await pool.fetchone(f"SELECT * FROM {self.table_name} WHERE id=?", (row_id,))
+            self.cache.set(('id', row_id), row, generation)
+        return row
 
     async def update_by_id(self, row_id: int, **kwargs):
-        async with aiosqlite.connect(DB_NAME) as db:
-            sets = ",".join([f"{k}=?" for k in kwargs.keys()])
-            await db.execute(f"UPDATE {self.table_name} SET {sets} WHERE id=?", [*kwargs.values(), row_id])
-            await db.commit()
\ No newline at end of file
+        sets = ",".join([f"{k}=?" for k in kwargs.keys()])
+        await writer.execute(f"UPDATE {self.table_name} SET {sets} WHERE id=?", [*kwargs.values(), row_id])
+        self.invalidate()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from .tenant import current_tenant
+
+
+class LookupCache:
+    """Bounded read-through cache of table rows keyed by name and by id.
+
+    Entries are evicted least-recently-used once ``maxsize`` is reached and
+    expire after ``ttl`` seconds when a ttl is given. Writes through any db
+    service of the same table call ``invalidate()``; the generation counter
+    stops a read that raced with such a write from storing a stale row.
+    Keys are scoped to the current tenant, so tenants sharing a cache never
+    see each other's rows.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+
+    def get(self, key):
+        """Return the cached row for ``key`` or None, counting hits/misses."""
+        key = (current_tenant.get(), key)
+        entry = self._rows.get(key)
+        if entry is not None:
+            expires_at, row = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._rows.move_to_end(key)
+                self.hits += 1
+                return row
+            del self._rows[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, row, generation: int):
+        if row is None or generation != self.generation:
+            return
+        key = (current_tenant.get(), key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._rows[key] = (expires_at, row)
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
+
+    def invalidate(self):
+        self.generation += 1
+        self._rows.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self._rows), 'hits': self.hits, 'misses': self.misses}
+
+
+# one cache per table, shared by every service instance of that table
+caches = {}
+# write version per (tenant, table), bumped by invalidate() on every
+# mutation; views rendered from a table carry the versions they were built from
+versions = {}
+
+
+def table_cache(table_name: str, maxsize: int = 1024, ttl: float = None) -> LookupCache:
+    if table_name not in caches:
+        caches[table_name] = LookupCache(maxsize=maxsize, ttl=ttl)
+    return caches[table_name]
+
+
+def invalidate(table_name: str):
+    key = (current_tenant.get(), table_name)
+    versions[key] = versions.get(key, 0) + 1
+    # the cache is shared by all tenants: a write clears the others' rows too,
+    # which only costs them a re-read
+    cache = caches.get(table_name)
+    if cache is not None:
+        cache.invalidate()
+
+
+def table_versions(*table_names) -> tuple:
+    """The current tenant followed by the write version of each table."""
+    tenant = current_tenant.get()
+    return (tenant,) + tuple(versions.get((tenant, table_name), 0) for table_name in table_names)
+
+
+def cache_stats() -> dict:
+    return {table_name: cache.stats() for table_name, cache in caches.items()}
@@ -1,12 +1,65 @@
-from .base import BaseDbService,DB_NAME
-import aiosqlite
+from .base import BaseDbService,LookupCache,writer
+from .ledger import post
+
 
 class ClientDbService(BaseDbService):
+    """Clients and their credit.
+
+    ``credit`` is the materialized balance of the client's entries in the
+    credit ledger; every change here appends its entry in the same write
+    job, so the two cannot drift apart.
+    """
+
+    def __init__(self,table_name:str,cache:LookupCache=None):
+        super().__init__(table_name=table_name,cache=cache)
+
+    async def add(self,**kwargs):
+        async def job(db):
+            cursor = await db.execute(self.get_add_query(**kwargs), list(kwargs.values()))
+            if cursor.rowcount:
+                await post(db, [(cursor.lastrowid, kwargs.get('credit', 0), 'opening balance')])
+            return cursor.lastrowid
+
+        row_id = await writer.run(job, "ClientDbService.add")
+        self.invalidate()
+        return row_id
+
+    async def update(self,name:int,credit:int,reason:str='credit update'):
+        async def job(db):
+            cursor = await db.execute(
+                "UPDATE client SET credit = credit + ? WHERE name = ? RETURNING id",
+                (credit, name)
+            )
+            await post(db, [(row[0], credit, reason) for row in await cursor.fetchall()])
+
+        await writer.run(job, "ClientDbService.update")
+        self.invalidate()
+
+    async def update_by_id(self, row_id: int, **kwargs):
+        if 'credit' not in kwargs:
+            return await super().update_by_id(row_id, **kwargs)
+        sets = ",".join([f"{k}=?" for k in kwargs.keys()])
+
+        async def job(db):
+            cursor = await db.execute("SELECT credit FROM client WHERE id=?", (row_id,))
+            before = await cursor.fetchone()
+            await db.execute(f"UPDATE client SET {sets} WHERE id=?", [*kwargs.values(), row_id])
+            if before is not None:
+                await post(db, [(row_id, kwargs['credit'] - before[0], 'credit set')])
 
-    def __init__(self,table_name:str):
-        super().__init__(table_name=table_name)
+        await writer.run(job, "ClientDbService.update_by_id")
+        self.invalidate()
 
-    async def update(self,name:int,credit:int):
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute("UPDATE client SET credit = credit + ? WHERE name = ?", (credit, name))
-            await db.commit()
\ No newline at end of file
+    async def after_upsert(self, db, columns: list, rows: list, existing: dict):
+        if 'credit' not in columns:
+            return
+        credit = columns.index('credit')
+        changed = {row[0]: row[credit] - (existing[row[0]][2] if row[0] in existing else 0) for row in rows}
+        changed = {name: amount for name, amount in changed.items() if amount}
+        ids = {}
+        names = list(changed)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            cursor = await db.execute(f"SELECT name, id FROM client WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update(await cursor.fetchall())
+        await post(db, [(ids[name], amount, 'import') for name, amount in changed.items()])
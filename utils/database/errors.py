@@ -0,0 +1,43 @@
+class DecisionError(Exception):
+    """Base class for reasons a request cannot be approved or rejected."""
+
+    def __init__(self, request_id: int, message: str):
+        super().__init__(message)
+        self.request_id = request_id
+
+
+class RequestNotFound(DecisionError):
+    def __init__(self, request_id: int):
+        super().__init__(request_id, f"request {request_id} not found")
+
+
+class RequestAlreadyDecided(DecisionError):
+    def __init__(self, request_id: int, approved: int):
+        super().__init__(request_id, f"request {request_id} was already decided")
+        self.approved = approved
+
+
+class InsufficientStock(DecisionError):
+    def __init__(self, request_id: int, nut_id: int, requested: int, available: int):
+        super().__init__(
+            request_id,
+            f"request {request_id} needs {requested} packages of nut {nut_id}, only {available} left"
+        )
+        self.nut_id = nut_id
+        self.requested = requested
+        self.available = available
+
+
+class InvalidPackages(DecisionError):
+    def __init__(self, request_id: int, packages: int):
+        super().__init__(request_id, f"request {request_id} asks for {packages} packages")
+        self.packages = packages
+
+
+class BackupFailed(Exception):
+    """A snapshot did not pass ``PRAGMA quick_check``."""
+
+    def __init__(self, path: str, reason: str):
+        super().__init__(f"backup of {path} failed: {reason}")
+        self.path = path
+        self.reason = reason
@@ -0,0 +1,101 @@
+from .base import BaseDbService,LookupCache,pool,writer,timestamp
+
+
+async def post(db, entries):
+    """Append ``(client_id, amount, reason)`` entries inside a writer job."""
+    now = timestamp()
+    await db.executemany(
+        "INSERT INTO credit_ledger (client_id, amount, reason, created_at) VALUES (?, ?, ?, ?)",
+        [(client_id, amount, reason, now) for client_id, amount, reason in entries if amount]
+    )
+
+
+class LedgerDbService(BaseDbService):
+    """Append-only history of every client credit change.
+
+    ``client.credit`` is the materialized balance: ClientDbService changes
+    it and appends the matching ledger entry in the same write job.
+    ``take_snapshots()`` records each changed client's balance together
+    with the last ledger id it covers, so a past balance or a statement
+    reads one snapshot plus the entries after it rather than the whole
+    history. ``verify()`` recomputes every balance from the ledger.
+    """
+
+    def __init__(self,table_name:str='credit_ledger',cache:LookupCache=None):
+        super().__init__(table_name=table_name,cache=cache)
+
+    async def _snapshot_before(self, client_id: int, at: str):
+        """(ledger_id, balance) of the latest snapshot taken at or before ``at``."""
+        row = await pool.fetchone(
+            "SELECT ledger_id, balance FROM credit_snapshot WHERE client_id=? AND taken_at<=? "
+            "ORDER BY taken_at DESC LIMIT 1",
+            (client_id, at)
+        )
+        return row or (0, 0.0)
+
+    async def balance_as_of(self, client_id: int, at: str) -> float:
+        """Balance after every entry created at or before ``at`` ('YYYY-MM-DD HH:MM:SS', UTC)."""
+        ledger_id, balance = await self._snapshot_before(client_id, at)
+        row = await pool.fetchone(
+            "SELECT COALESCE(SUM(amount), 0) FROM credit_ledger WHERE client_id=? AND id>? AND created_at<=?",
+            (client_id, ledger_id, at)
+        )
+        return balance + row[0]
+
+    async def statement(self, client_id: int, since: str, limit: int = 50):
+        """Return (opening balance at ``since``, entries after it, oldest first).
+
+        Entries are (id, amount, reason, created_at) rows, at most ``limit``.
+        """
+        ledger_id, balance = await self._snapshot_before(client_id, since)
+        opening = await pool.fetchone(
+            "SELECT COALESCE(SUM(amount), 0) FROM credit_ledger WHERE client_id=? AND id>? AND created_at<=?",
+            (client_id, ledger_id, since)
+        )
+        # entries up to the snapshot all predate ``since``, so the scan starts there
+        rows = await pool.fetchall(
+            "SELECT id, amount, reason, created_at FROM credit_ledger WHERE client_id=? AND id>? AND created_at>? "
+            "ORDER BY id LIMIT ?",
+            (client_id, ledger_id, since, limit)
+        )
+        return balance + opening[0], rows
+
+    async def take_snapshots(self) -> int:
+        """Snapshot the balance of every client with entries since the last run."""
+        async def job(db):
+            cursor = await db.execute("SELECT COALESCE(MAX(ledger_id), 0) FROM credit_snapshot")
+            (last_id,) = await cursor.fetchone()
+            # one statement however many clients changed: each new balance is
+            # the client's latest snapshot plus its entries since the last run
+            cursor = await db.execute(
+                """
+                INSERT OR REPLACE INTO credit_snapshot (client_id, taken_at, ledger_id, balance)
+                SELECT c.client_id, ?, c.last_id, c.amount + COALESCE((
+                    SELECT s.balance FROM credit_snapshot s
+                    WHERE s.client_id = c.client_id ORDER BY s.taken_at DESC LIMIT 1
+                ), 0)
+                FROM (
+                    SELECT client_id, SUM(amount) AS amount, MAX(id) AS last_id
+                    FROM credit_ledger WHERE id>? GROUP BY client_id
+                ) c
+                """,
+                (timestamp(), last_id)
+            )
+            return cursor.rowcount
+        return await writer.run(job, "LedgerDbService.take_snapshots")
+
+    async def verify(self, tolerance: float = 1e-6):
+        """Recompute every balance from the ledger; return drifting clients.
+
+        Rows are (client_id, name, materialized credit, ledger total).
+        """
+        return await pool.fetchall(
+            """
+            SELECT c.id, c.name, c.credit, COALESCE(l.total, 0)
+            FROM client c
+            LEFT JOIN (SELECT client_id, SUM(amount) AS total FROM credit_ledger GROUP BY client_id) l
+                ON l.client_id = c.id
+            WHERE abs(c.credit - COALESCE(l.total, 0)) > ?
+            """,
+            (tolerance,)
+        )
@@ -0,0 +1,188 @@
+"""Versioned schema migrations tracked through ``PRAGMA user_version``.
+
+``MIGRATIONS[i]`` holds the statements that bring the database from
+version ``i`` to version ``i + 1``. Append new steps at the end; never
+edit or reorder a step that has already shipped.
+"""
+
+
+# rollup table -> (key column, summed column, request column summed into it)
+ROLLUPS = {
+    'rollup_nut_daily': ('nut_id', 'packages', 'packages'),
+    'rollup_admin_daily': ('admin_id', 'credit', 'credit_paid'),
+}
+
+
+# created_at given to requests made before the column existed (migration 8);
+# reports show its rollup day as "undated"
+UNDATED = '0001-01-01 00:00:00'
+
+
+def rollup_ddl(table: str, name: str = None) -> str:
+    """Daily rollup table (see report.py), optionally under another name."""
+    key, total, _ = ROLLUPS[table]
+    return f"""
+        CREATE TABLE IF NOT EXISTS {name or table} (
+            day TEXT NOT NULL,
+            {key} INTEGER NOT NULL,
+            {total} REAL NOT NULL DEFAULT 0,
+            requests INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, {key})
+        ) WITHOUT ROWID
+    """
+
+
+def name_index(table: str) -> list:
+    """FTS5 trigram index over ``table.name``, kept in sync by triggers."""
+    fts = f"{table}_name_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+MIGRATIONS = [
+    # 1: indexes for the request access patterns (pending queue, per admin,
+    # per nut, per requester), each ending in id so keyset pages stay covered
+    [
+        "CREATE INDEX IF NOT EXISTS idx_request_approved ON request (approved, id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_admin ON request (admin_id, approved, id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_nut ON request (nut_id, approved, id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_requester ON request (requester_id, id)",
+    ],
+    # 2: creation time of each request, filled in by RequestDbService.add()
+    [
+        "ALTER TABLE request ADD COLUMN created_at TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_request_created_at ON request (created_at)",
+    ],
+    # 3: payments recorded when a request is approved
+    [
+        """
+        CREATE TABLE IF NOT EXISTS payment (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER UNIQUE NOT NULL,
+            admin_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (request_id) REFERENCES request(id),
+            FOREIGN KEY (admin_id) REFERENCES admin(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_payment_admin ON payment (admin_id, created_at)",
+    ],
+    # 4: per-user and per-conversation bot state (utils/persistence.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS persisted_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS persisted_conversation (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+        """,
+    ],
+    # 5: trigram name indexes behind ClientDbService/NutDbService.search()
+    name_index('client') + name_index('nut'),
+    # 6: append-only client credit ledger and balance snapshots (ledger.py);
+    # existing balances become opening entries
+    [
+        """
+        CREATE TABLE IF NOT EXISTS credit_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            reason TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (client_id) REFERENCES client(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_credit_ledger_client ON credit_ledger (client_id, id)",
+        """
+        CREATE TRIGGER IF NOT EXISTS credit_ledger_no_update BEFORE UPDATE ON credit_ledger BEGIN
+            SELECT RAISE(ABORT, 'credit_ledger is append-only');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS credit_ledger_no_delete BEFORE DELETE ON credit_ledger BEGIN
+            SELECT RAISE(ABORT, 'credit_ledger is append-only');
+        END
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS credit_snapshot (
+            client_id INTEGER NOT NULL,
+            taken_at TEXT NOT NULL,
+            ledger_id INTEGER NOT NULL,
+            balance REAL NOT NULL,
+            PRIMARY KEY (client_id, taken_at)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_credit_snapshot_ledger ON credit_snapshot (ledger_id)",
+        """
+        INSERT INTO credit_ledger (client_id, amount, reason, created_at)
+        SELECT id, credit, 'opening balance', strftime('%Y-%m-%d %H:%M:%S', 'now')
+        FROM client WHERE credit != 0
+        """,
+    ],
+    # 7: daily report rollups, filled from history by ReportDbService.backfill()
+    [
+        rollup_ddl('rollup_nut_daily'),
+        rollup_ddl('rollup_admin_daily'),
+    ],
+    # 8: date the requests made before migration 2, so the rollups can count them
+    [
+        f"UPDATE request SET created_at = '{UNDATED}' WHERE created_at IS NULL",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def get_version(db) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    return version
+
+
+async def migrate(db) -> int:
+    """Apply every pending migration in one transaction and return the version.
+
+    An up-to-date database costs a single PRAGMA read.
+    """
+    if await get_version(db) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        # re-read under the write lock in case another process migrated first
+        version = await get_version(db)
+        for version, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+            for sql in steps:
+                await db.execute(sql)
+            await db.execute(f"PRAGMA user_version = {version}")
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return version
@@ -1,16 +1,14 @@
-from .base import BaseDbService,DB_NAME
-import aiosqlite
+from .base import BaseDbService,LookupCache,writer
 
 class NutDbService(BaseDbService):
 
-    def __init__(self,table_name:str):
-        super().__init__(table_name=table_name)
+    def __init__(self,table_name:str,cache:LookupCache=None):
+        super().__init__(table_name=table_name,cache=cache)
 
     async def update(self,nut_id: int, delta: int):
         """Increase or decrease the number of packages for a nut."""
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "UPDATE nuts SET packages = packages + ? WHERE id = ?",
-                (delta, nut_id)
-            )
-            await db.commit()
\ No newline at end of file
+        await writer.execute(
+            "UPDATE nut SET packages = packages + ? WHERE id = ?",
+            (delta, nut_id)
+        )
+        self.invalidate()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import aiosqlite
+from utils.metrics import observe_sql
+
+
+class ConnectionPool:
+    """A fixed-size pool of long-lived aiosqlite connections.
+
+    Connections are opened once (in ``init_db``) and handed out to the
+    db services, so a query no longer pays for a new thread and the
+    PRAGMA setup every time it runs.
+    """
+
+    def __init__(self, db_name: str, size: int = 4, busy_timeout: int = 5000):
+        self.db_name = db_name
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._queue = None
+        self._connections = []
+        self._lock = asyncio.Lock()
+
+    async def connect(self, **kwargs) -> aiosqlite.Connection:
+        """Open a single connection configured the way the pool expects."""
+        db = await aiosqlite.connect(self.db_name, **kwargs)
+        await db.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    async def open(self):
+        async with self._lock:
+            if self._queue is not None:
+                return
+            queue = asyncio.Queue()
+            # each connection opens on its own thread, so open them together
+            self._connections = list(await asyncio.gather(*(self.connect() for _ in range(self.size))))
+            for db in self._connections:
+                queue.put_nowait(db)
+            self._queue = queue
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection for the duration of the ``async with`` block."""
+        if self._queue is None:
+            await self.open()
+        db = await self._queue.get()
+        try:
+            yield db
+        finally:
+            # never hand a half-finished transaction to the next borrower
+            if db.in_transaction:
+                await db.rollback()
+            self._queue.put_nowait(db)
+
+    async def fetchone(self, sql: str, params=()):
+        async with self.acquire() as db:
+            start = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            result = await cursor.fetchone()
+            observe_sql(sql, time.perf_counter() - start)
+            return result
+
+    async def fetchall(self, sql: str, params=()):
+        async with self.acquire() as db:
+            start = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            result = await cursor.fetchall()
+            observe_sql(sql, time.perf_counter() - start)
+            return result
+
+    async def set_trace_callback(self, callback):
+        """Call ``callback(sql)`` for every statement run on a pooled connection."""
+        await self.open()
+        for db in self._connections:
+            await db.set_trace_callback(callback)
+
+    async def close(self):
+        async with self._lock:
+            for db in self._connections:
+                await db.close()
+            self._connections = []
+            self._queue = None
@@ -0,0 +1,160 @@
+import asyncio
+from .base import BaseDbService,LookupCache,pool,writer,timestamp
+from .migrations import ROLLUPS, UNDATED, rollup_ddl
+
+# approved requests counted by backfill(), dated by their payment or else their creation
+APPROVED_HISTORY = (
+    "FROM request r LEFT JOIN payment p ON p.request_id = r.id "
+    "WHERE r.approved = 1 AND COALESCE(p.created_at, r.created_at) IS NOT NULL"
+)
+# rollup day of requests made before dates were recorded
+UNDATED_DAY = UNDATED[:10]
+
+
+def upsert_sql(table: str, name: str = None) -> str:
+    key, total, _ = ROLLUPS[table]
+    return (
+        f"INSERT INTO {name or table} (day, {key}, {total}, requests) VALUES (?, ?, ?, ?) "
+        f"ON CONFLICT(day, {key}) DO UPDATE SET "
+        f"{total} = {total} + excluded.{total}, requests = requests + excluded.requests"
+    )
+
+
+async def add_to_rollups(db, rows, day: str = None):
+    """Count approved request rows (REQUEST_COLUMNS order) into today's rollups.
+
+    Called inside the approval write jobs so the rollups move in the
+    same transaction as the requests.
+    """
+    day = day or timestamp()[:10]
+    columns = {'nut_id': 2, 'admin_id': 1, 'packages': 3, 'credit_paid': 4}
+    for table, (key, _, source) in ROLLUPS.items():
+        totals = {}
+        for row in rows:
+            amount, count = totals.get(row[columns[key]], (0, 0))
+            totals[row[columns[key]]] = (amount + row[columns[source]], count + 1)
+        await db.executemany(
+            upsert_sql(table),
+            [(day, key_id, amount, count) for key_id, (amount, count) in totals.items()]
+        )
+
+
+class ReportDbService(BaseDbService):
+    """Reports read from the daily rollup tables only.
+
+    The rollups hold one row per day and nut (packages approved) and per
+    day and admin (credit collected), so a report costs a range over a
+    few rows per day no matter how many requests there are.
+    """
+
+    def __init__(self,table_name:str='rollup_nut_daily',cache:LookupCache=None):
+        super().__init__(table_name=table_name,cache=cache)
+
+    async def nuts_by_day(self, since: str, limit: int = 200):
+        """(day, nut name, packages, requests) from ``since`` (YYYY-MM-DD), newest first.
+
+        Requests approved before dates were recorded follow as day 'undated'.
+        """
+        return await pool.fetchall(
+            """
+            SELECT CASE WHEN r.day = ? THEN 'undated' ELSE r.day END, n.name, r.packages, r.requests
+            FROM rollup_nut_daily r JOIN nut n ON n.id = r.nut_id
+            WHERE r.day >= ? OR r.day = ?
+            ORDER BY r.day = ?, r.day DESC, r.packages DESC
+            LIMIT ?
+            """,
+            (UNDATED_DAY, since, UNDATED_DAY, UNDATED_DAY, limit)
+        )
+
+    async def admins_by_week(self, since: str, limit: int = 200):
+        """(week, admin name, credit, requests) from ``since`` (YYYY-MM-DD), newest first.
+
+        Requests approved before dates were recorded follow as week 'undated'.
+        """
+        return await pool.fetchall(
+            """
+            SELECT CASE WHEN r.day = ? THEN 'undated' ELSE strftime('%Y-W%W', r.day) END AS week,
+                   a.name, SUM(r.credit), SUM(r.requests)
+            FROM rollup_admin_daily r JOIN admin a ON a.id = r.admin_id
+            WHERE r.day >= ? OR r.day = ?
+            GROUP BY week, r.admin_id
+            ORDER BY week = 'undated', week DESC, 3 DESC
+            LIMIT ?
+            """,
+            (UNDATED_DAY, since, UNDATED_DAY, limit)
+        )
+
+    async def needs_backfill(self) -> bool:
+        """backfill() has requests to count but the rollups are empty (e.g. right after migrating)."""
+        row = await pool.fetchone(
+            f"SELECT EXISTS (SELECT 1 {APPROVED_HISTORY}) "
+            "AND NOT EXISTS (SELECT 1 FROM rollup_nut_daily)"
+        )
+        return bool(row[0])
+
+    async def backfill(self, batch_size: int = 10000) -> int:
+        """Rebuild the rollups from request history in batches of request ids.
+
+        Batches are summed into scratch tables, each batch its own write
+        job so approvals keep flowing in between. Only payments up to a
+        watermark taken at the start are counted; the final job swaps the
+        scratch tables in and adds the approvals made since the watermark.
+        Requests approved before payments were recorded count on the day
+        they were created, or on the UNDATED day when that is not known
+        either. Returns the number of requests counted.
+        """
+        async def start(db):
+            for table in ROLLUPS:
+                await db.execute(f"DROP TABLE IF EXISTS {table}_rebuild")
+                await db.execute(rollup_ddl(table, f"{table}_rebuild"))
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM payment")
+            (watermark,) = await cursor.fetchone()
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM request")
+            (max_id,) = await cursor.fetchone()
+            return watermark, max_id
+
+        watermark, max_id = await writer.run(start, "ReportDbService.backfill")
+
+        async def add_batch(db, first: int, last: int):
+            for table, (key, total, source) in ROLLUPS.items():
+                await db.execute(
+                    f"""
+                    INSERT INTO {table}_rebuild (day, {key}, {total}, requests)
+                    SELECT date(COALESCE(p.created_at, r.created_at)) AS day, r.{key}, SUM(r.{source}), COUNT(*)
+                    {APPROVED_HISTORY}
+                        AND r.id BETWEEN ? AND ? AND (p.id IS NULL OR p.id <= ?)
+                    GROUP BY day, r.{key}
+                    ON CONFLICT(day, {key}) DO UPDATE SET
+                        {total} = {total} + excluded.{total}, requests = requests + excluded.requests
+                    """,
+                    (first, last, watermark)
+                )
+
+        for first in range(1, max_id + 1, batch_size):
+            await writer.run(
+                lambda db, first=first: add_batch(db, first, first + batch_size - 1),
+                "ReportDbService.backfill"
+            )
+            # let queued writes through between batches
+            await asyncio.sleep(0)
+
+        async def swap(db):
+            cursor = await db.execute("SELECT COALESCE(SUM(requests), 0) FROM rollup_nut_daily_rebuild")
+            (counted,) = await cursor.fetchone()
+            for table in ROLLUPS:
+                await db.execute(f"DELETE FROM {table}")
+                await db.execute(f"INSERT INTO {table} SELECT * FROM {table}_rebuild")
+                await db.execute(f"DROP TABLE {table}_rebuild")
+            cursor = await db.execute(
+                """
+                SELECT r.id, r.admin_id, r.nut_id, r.packages, r.credit_paid, date(p.created_at)
+                FROM payment p JOIN request r ON r.id = p.request_id
+                WHERE p.id > ?
+                """,
+                (watermark,)
+            )
+            for row in await cursor.fetchall():
+                await add_to_rollups(db, [row], row[5])
+            return counted
+
+        return await writer.run(swap, "ReportDbService.backfill")
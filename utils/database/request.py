@@ -1,30 +1,232 @@
-from .base import BaseDbService,DB_NAME
-import aiosqlite
+import asyncio
+from .base import BaseDbService,LookupCache,pool,writer,timestamp
+from .cache import invalidate
+from .tenant import current_tenant
+from .errors import RequestNotFound, RequestAlreadyDecided, InsufficientStock, InvalidPackages
+from .report import add_to_rollups
+
+# values of request.approved
+PENDING, APPROVED, REJECTED = 0, 1, -1
+
+REQUEST_COLUMNS = "id, admin_id, nut_id, packages, credit_paid, description, requester_id, approved"
 
 
 class RequestDbService(BaseDbService):
 
-    def __init__(self,table_name:str):
-        super().__init__(table_name=table_name)
+    def __init__(self,table_name:str,cache:LookupCache=None,decisions:LookupCache=None):
+        super().__init__(table_name=table_name,cache=cache)
+        # list pages join in the admin and nut names
+        self.view_tables = (table_name, 'admin', 'nut')
+        # final state of requests decided through decide(); a decision never
+        # changes on its own, so entries are only dropped by set_approved()
+        self.decisions = decisions if decisions is not None else LookupCache()
+        # decide() calls running now, per (tenant, request id)
+        self._in_flight = {}
+
+    async def add(self,**kwargs):
+        kwargs.setdefault('created_at', timestamp())
+        return await super().add(**kwargs)
 
     async def list(self):
         """Return all requests with related admin and nut names."""
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute("""
-                SELECT r.id, a.name AS admin, n.name AS nut, r.packages, r.credit_paid, r.description, r.requester_id, r.approved
-                FROM request r
-                JOIN admin a ON r.admin_id = a.id
-                JOIN nut n ON r.nut_id = n.id
-            """)
-            return await cursor.fetchall()
+        return await pool.fetchall("""
+            SELECT r.id, a.name AS admin, n.name AS nut, r.packages, r.credit_paid, r.description, r.requester_id, r.approved
+            FROM request r
+            JOIN admin a ON r.admin_id = a.id
+            JOIN nut n ON r.nut_id = n.id
+        """)
+
+    def get_page_query(self, before: bool) -> str:
+        """Same columns as list(), restricted to one keyset page."""
+        return f"""
+            SELECT r.id, a.name AS admin, n.name AS nut, r.packages, r.credit_paid, r.description, r.requester_id, r.approved
+            FROM request r
+            JOIN admin a ON r.admin_id = a.id
+            JOIN nut n ON r.nut_id = n.id
+            WHERE r.id {'<' if before else '>'} ?
+            ORDER BY r.id {'DESC' if before else 'ASC'}
+            LIMIT ?
+        """
 
     async def get_by_id(self, row_id: int):
-        async with aiosqlite.connect(DB_NAME) as db:
-            cursor = await db.execute("SELECT * FROM request WHERE id=?", (row_id,))
-            return await cursor.fetchone()
+        # explicit columns so migrations adding columns don't change the row shape
+        return await pool.fetchone(
+            f"SELECT {REQUEST_COLUMNS} FROM request WHERE id=?",
+            (row_id,)
+        )
 
     async def set_approved(self, row_id: int, approved: bool):
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute("UPDATE request SET approved=? WHERE id=?", (1 if approved else 0, row_id))
-            await db.commit()
+        await writer.execute("UPDATE request SET approved=? WHERE id=?", (APPROVED if approved else PENDING, row_id))
+        self.invalidate()
+        self.decisions.invalidate()
+
+    @staticmethod
+    async def _claim_pending(db, row_id: int, approved: int):
+        """Move a pending request to ``approved`` and return its row.
+
+        Checking the state and flipping it is one statement, so two
+        decisions on the same request can never both succeed.
+        """
+        cursor = await db.execute(
+            f"UPDATE request SET approved=? WHERE id=? AND approved={PENDING} RETURNING {REQUEST_COLUMNS}",
+            (approved, row_id)
+        )
+        rows = await cursor.fetchall()
+        if rows:
+            return rows[0]
+        cursor = await db.execute("SELECT approved FROM request WHERE id=?", (row_id,))
+        row = await cursor.fetchone()
+        if row is None:
+            raise RequestNotFound(row_id)
+        raise RequestAlreadyDecided(row_id, row[0])
+
+    async def approve(self, row_id: int):
+        """Approve a pending request atomically and return its row.
+
+        Inside one write transaction: mark the request approved, take its
+        packages out of stock (never below zero), record the payment and
+        count it into the report rollups.
+        Raises RequestNotFound, RequestAlreadyDecided, InvalidPackages or
+        InsufficientStock, in which case nothing is changed.
+        """
+        async def job(db):
+            row = await self._claim_pending(db, row_id, APPROVED)
+            _, admin_id, nut_id, packages, credit_paid, _, _, _ = row
+            # a negative count would put packages back into stock
+            if packages <= 0:
+                raise InvalidPackages(row_id, packages)
+            cursor = await db.execute(
+                "UPDATE nut SET packages = packages - ? WHERE id = ? AND packages >= ?",
+                (packages, nut_id, packages)
+            )
+            if cursor.rowcount == 0:
+                cursor = await db.execute("SELECT packages FROM nut WHERE id=?", (nut_id,))
+                stock = await cursor.fetchone()
+                raise InsufficientStock(row_id, nut_id, packages, stock[0] if stock else 0)
+            await db.execute(
+                "INSERT INTO payment (request_id, admin_id, amount, created_at) VALUES (?, ?, ?, ?)",
+                (row_id, admin_id, credit_paid, timestamp())
+            )
+            await add_to_rollups(db, [row])
+            return row[:-1] + (APPROVED,)
+
+        row = await writer.run(job)
+        self.invalidate()
+        invalidate('nut')
+        return row
+
+    async def reject(self, row_id: int):
+        """Reject a pending request atomically and return its row."""
+        async def job(db):
+            row = await self._claim_pending(db, row_id, REJECTED)
+            return row[:-1] + (REJECTED,)
+
+        row = await writer.run(job)
+        self.invalidate()
+        return row
+
+    async def decide(self, row_id: int, approve: bool):
+        """approve() or reject() once per request, however often it is asked.
+
+        Concurrent calls for the same request share one execution: the
+        first runs it and gets the row, the others wait for it and get its
+        error, or RequestAlreadyDecided when it succeeded. After that the
+        decision is remembered and repeats raise RequestAlreadyDecided
+        without touching the database. Failures (e.g. InsufficientStock)
+        are not remembered, so the request can be decided later.
+        """
+        approved = self.decisions.get(row_id)
+        if approved is not None:
+            raise RequestAlreadyDecided(row_id, approved)
+        key = (current_tenant.get(), row_id)
+        running = self._in_flight.get(key)
+        if running is not None:
+            row = await asyncio.shield(running)
+            raise RequestAlreadyDecided(row_id, row[-1])
+
+        running = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = running
+        try:
+            row = await (self.approve(row_id) if approve else self.reject(row_id))
+        except Exception as e:
+            if isinstance(e, RequestAlreadyDecided):
+                self.decisions.set(row_id, e.approved, self.decisions.generation)
+            running.set_exception(e)
+            # mark it retrieved, nobody may be waiting
+            running.exception()
+            raise
+        except BaseException:
+            running.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+        self.decisions.set(row_id, row[-1], self.decisions.generation)
+        running.set_result(row)
+        return row
+
+    async def decide_many(self, approve: bool, nut_id: int = None, admin_id: int = None, max_id: int = None):
+        """Approve or reject every pending request matching the filters.
+
+        Runs as one write transaction with one ``executemany`` per table.
+        When approving, requests are taken in id order while their nut has
+        enough stock; the rest, and requests for no packages, stay pending. Returns (decided, skipped)
+        lists of request rows.
+        """
+        conditions, params = [f"approved={PENDING}"], []
+        for column, value in (('nut_id', nut_id), ('admin_id', admin_id)):
+            if value is not None:
+                conditions.append(f"{column}=?")
+                params.append(value)
+        if max_id is not None:
+            conditions.append("id<=?")
+            params.append(max_id)
+        where = " AND ".join(conditions)
+        state = APPROVED if approve else REJECTED
+
+        async def job(db):
+            cursor = await db.execute(f"SELECT {REQUEST_COLUMNS} FROM request WHERE {where} ORDER BY id", params)
+            rows = await cursor.fetchall()
+            if not rows:
+                return [], []
+
+            decided, skipped, taken = rows, [], {}
+            if approve:
+                cursor = await db.execute(
+                    f"SELECT id, packages FROM nut WHERE id IN (SELECT DISTINCT nut_id FROM request WHERE {where})",
+                    params
+                )
+                stock = dict(await cursor.fetchall())
+                decided = []
+                for row in rows:
+                    nut, packages = row[2], row[3]
+                    if 0 < packages <= stock.get(nut, 0):
+                        stock[nut] -= packages
+                        taken[nut] = taken.get(nut, 0) + packages
+                        decided.append(row)
+                    else:
+                        skipped.append(row)
+
+            await db.executemany(
+                f"UPDATE request SET approved=? WHERE id=? AND approved={PENDING}",
+                [(state, row[0]) for row in decided]
+            )
+            if approve:
+                await db.executemany(
+                    "UPDATE nut SET packages = packages - ? WHERE id = ? AND packages >= ?",
+                    [(packages, nut, packages) for nut, packages in taken.items()]
+                )
+                now = timestamp()
+                await db.executemany(
+                    "INSERT INTO payment (request_id, admin_id, amount, created_at) VALUES (?, ?, ?, ?)",
+                    [(row[0], row[1], row[4], now) for row in decided]
+                )
+                await add_to_rollups(db, decided, now[:10])
+            return [row[:-1] + (state,) for row in decided], skipped
 
+        decided, skipped = await writer.run(job)
+        self.invalidate()
+        if approve:
+            invalidate('nut')
+        for row in decided:
+            self.decisions.set(row[0], row[-1], self.decisions.generation)
+        return decided, skipped
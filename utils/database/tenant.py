@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from .pool import ConnectionPool
+from .writer import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+# the tenant using DB_NAME; it stays open for the life of the process
+DEFAULT_TENANT = ''
+# tenant of the update being handled, set by the update processor
+current_tenant = ContextVar('tenant', default=DEFAULT_TENANT)
+
+
+def valid_name(name: str) -> bool:
+    # tenant names become file names
+    return bool(name) and name.replace('_', '').replace('-', '').isalnum()
+
+
+def parse_tenants(spec: str) -> dict:
+    """``"downtown:-1001,-1002;airport:555"`` -> {-1001: 'downtown', -1002: 'downtown', 555: 'airport'}"""
+    ids = {}
+    for entry in filter(None, (part.strip() for part in spec.split(';'))):
+        name, _, members = entry.partition(':')
+        name = name.strip()
+        if not valid_name(name):
+            raise ValueError(f"Invalid tenant name {name!r} in TENANTS")
+        for member in filter(None, (m.strip() for m in members.split(','))):
+            ids[int(member)] = name
+    return ids
+
+
+@contextmanager
+def tenant_scope(name: str):
+    """Run the block as tenant ``name``, for work done outside an update."""
+    token = current_tenant.set(name)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+def tag(data: str) -> str:
+    """Callback data naming the current tenant, for buttons sent outside its chats."""
+    tenant = current_tenant.get()
+    return f"{data}@{tenant}" if tenant != DEFAULT_TENANT else data
+
+
+def untag(data: str) -> tuple:
+    """Split tagged callback data into (data, tenant or None)."""
+    data, _, tenant = data.partition('@')
+    return data, (tenant if valid_name(tenant) else None)
+
+
+class Tenant:
+    """One tenant's database file with its own connection pool and writer."""
+
+    def __init__(self, name: str, path: str, pool_options: dict, writer_options: dict):
+        self.name = name
+        self.path = path
+        self.pool = ConnectionPool(path, **pool_options)
+        self.writer = WriteQueue(self.pool, **writer_options)
+        # callers currently holding the tenant, see TenantManager.use()
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    async def open(self, create_schema):
+        await self.pool.open()
+        async with self.pool.acquire() as db:
+            await create_schema(db)
+        await self.writer.start()
+
+    async def close(self):
+        await self.writer.stop()
+        await self.pool.close()
+
+
+class TenantManager:
+    """Opens tenant databases on first use and closes idle ones.
+
+    Every tenant has its own file, pool and single writer, so tenants
+    never wait on each other's write lock. At most ``max_open`` tenants
+    stay open: opening one more closes the least recently used tenant
+    that nobody is using, and ``close_idle()`` closes tenants unused for
+    ``idle_seconds``. The default tenant is never closed.
+
+    ``members`` maps chat and user ids to tenant names (see parse_tenants);
+    with ``per_chat`` every other group chat is a tenant of its own.
+
+    Coroutine functions in ``on_open`` run in the background, in the
+    tenant's scope and holding it open, each time a tenant is opened.
+    """
+
+    def __init__(self, create_schema, db_name: str, db_dir: str, members: dict = None, per_chat: bool = False,
+                 max_open: int = 32, idle_seconds: float = 600, pool_options: dict = None, writer_options: dict = None):
+        self.create_schema = create_schema
+        self.members = members or {}
+        self.per_chat = per_chat
+        self.db_name = db_name
+        self.db_dir = db_dir
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.pool_options = pool_options or {}
+        self.writer_options = writer_options or {}
+        self.open_tenants = OrderedDict()
+        self.opened = 0
+        self.closed = 0
+        self.on_open = []
+        self._hooks = set()
+        self._lock = asyncio.Lock()
+
+    def resolve(self, chat_id: int = None, user_id: int = None, group: bool = False) -> str:
+        """Tenant of an update from ``chat_id`` (a group chat when ``group``) sent by ``user_id``."""
+        if chat_id in self.members:
+            return self.members[chat_id]
+        if group and self.per_chat:
+            return f"chat_{chat_id}"
+        return self.members.get(user_id, DEFAULT_TENANT)
+
+    def path(self, name: str) -> str:
+        if name == DEFAULT_TENANT:
+            return self.db_name
+        return os.path.join(self.db_dir, f"{name}.db")
+
+    async def get(self, name: str = None) -> Tenant:
+        """The open tenant ``name`` (default: the current one), opening it if needed."""
+        name = current_tenant.get() if name is None else name
+        tenant = self.open_tenants.get(name)
+        if tenant is None:
+            async with self._lock:
+                tenant = self.open_tenants.get(name)
+                if tenant is None:
+                    if name != DEFAULT_TENANT:
+                        os.makedirs(self.db_dir, exist_ok=True)
+                    tenant = Tenant(name, self.path(name), self.pool_options, self.writer_options)
+                    await tenant.open(self.create_schema)
+                    self.open_tenants[name] = tenant
+                    self.opened += 1
+                    await self._evict(keep=name)
+                    for hook in self.on_open:
+                        with tenant_scope(name):
+                            task = asyncio.create_task(self._run_hook(name, hook))
+                        self._hooks.add(task)
+                        task.add_done_callback(self._hooks.discard)
+        self.open_tenants.move_to_end(name)
+        return tenant
+
+    async def _run_hook(self, name: str, hook):
+        try:
+            async with self.use(name):
+                await hook()
+        except Exception:
+            logger.exception("Opening tenant %r: %s failed", name, getattr(hook, '__qualname__', hook))
+
+    @asynccontextmanager
+    async def use(self, name: str = None):
+        """Hold a tenant open for the duration of the ``async with`` block."""
+        tenant = await self.get(name)
+        tenant.users += 1
+        try:
+            yield tenant
+        finally:
+            tenant.users -= 1
+            tenant.last_used = time.monotonic()
+
+    def names(self) -> list:
+        return list(self.open_tenants)
+
+    async def _close(self, tenant: Tenant):
+        # out of the dict first so nobody picks it up while it closes
+        del self.open_tenants[tenant.name]
+        await tenant.close()
+        self.closed += 1
+
+    async def _evict(self, keep: str):
+        idle = [t for t in self.open_tenants.values() if not t.users and t.name not in (DEFAULT_TENANT, keep)]
+        for tenant in idle[:max(0, len(self.open_tenants) - self.max_open)]:
+            await self._close(tenant)
+
+    async def close_idle(self) -> int:
+        """Close tenants nobody has used for ``idle_seconds``; return how many."""
+        cutoff = time.monotonic() - self.idle_seconds
+        async with self._lock:
+            idle = [
+                t for t in self.open_tenants.values()
+                if not t.users and t.name != DEFAULT_TENANT and t.last_used < cutoff
+            ]
+            for tenant in idle:
+                await self._close(tenant)
+        return len(idle)
+
+    async def close_idle_periodically(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.close_idle()
+            except Exception:
+                logger.exception("Closing idle tenant databases failed")
+
+    async def close_all(self):
+        for task in list(self._hooks):
+            task.cancel()
+        await asyncio.gather(*self._hooks, return_exceptions=True)
+        async with self._lock:
+            for tenant in list(self.open_tenants.values()):
+                await self._close(tenant)
+
+    def stats(self) -> dict:
+        return {'open': len(self.open_tenants), 'opened': self.opened, 'closed': self.closed}
+
+
+class TenantPool:
+    """ConnectionPool interface that runs on the current tenant's pool.
+
+    A fixed ``tenant`` pins it to that tenant instead (persistence uses
+    the default tenant whatever update is being handled).
+    """
+
+    def __init__(self, tenants: TenantManager, tenant: str = None):
+        self.tenants = tenants
+        self.tenant = tenant
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.tenants.use(self.tenant) as tenant:
+            async with tenant.pool.acquire() as db:
+                yield db
+
+    async def fetchone(self, sql: str, params=()):
+        async with self.tenants.use(self.tenant) as tenant:
+            return await tenant.pool.fetchone(sql, params)
+
+    async def fetchall(self, sql: str, params=()):
+        async with self.tenants.use(self.tenant) as tenant:
+            return await tenant.pool.fetchall(sql, params)
+
+    async def set_trace_callback(self, callback):
+        tenant = await self.tenants.get(self.tenant)
+        await tenant.pool.set_trace_callback(callback)
+
+
+class TenantWriter:
+    """WriteQueue interface that queues jobs on the current tenant's writer."""
+
+    def __init__(self, tenants: TenantManager, tenant: str = None):
+        self.tenants = tenants
+        self.tenant = tenant
+
+    async def run(self, job, label: str = None):
+        async with self.tenants.use(self.tenant) as tenant:
+            return await tenant.writer.run(job, label)
+
+    async def execute(self, sql: str, params=()):
+        async with self.tenants.use(self.tenant) as tenant:
+            return await tenant.writer.execute(sql, params)
+
+    async def execute_rowcount(self, sql: str, params=()):
+        async with self.tenants.use(self.tenant) as tenant:
+            return await tenant.writer.execute_rowcount(sql, params)
+
+    async def set_trace_callback(self, callback):
+        tenant = await self.tenants.get(self.tenant)
+        await tenant.writer.set_trace_callback(callback)
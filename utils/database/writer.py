@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from utils.metrics import observe_sql
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """Single-writer actor that group-commits every database mutation.
+
+    One asyncio task owns the write connection. Callers hand it jobs
+    (``async def job(db)``) and await a future; the task runs whatever is
+    queued in one ``BEGIN IMMEDIATE`` transaction, bounded by
+    ``max_batch`` jobs and ``max_delay`` seconds, and resolves the futures
+    once the batch is committed. Each job runs inside its own SAVEPOINT so
+    a failing job is rolled back without taking the rest of the batch
+    with it. If a batch cannot even be rolled back, its jobs fail and the
+    write connection is reopened for the next batch.
+    """
+
+    def __init__(self, pool, max_batch: int = 64, max_delay: float = 0.002):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._db = None
+        self._queue = None
+        self._task = None
+        self._trace = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self._task is not None:
+                return
+            self._db = await self.pool.connect(isolation_level=None)
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._loop(), name="db-writer")
+
+    async def stop(self):
+        async with self._lock:
+            if self._task is None:
+                return
+            # pending jobs are still committed before the sentinel is reached
+            await self._queue.put(None)
+            await self._task
+            if self._db is not None:
+                await self._db.close()
+            self._task = self._queue = self._db = None
+
+    async def set_trace_callback(self, callback):
+        """Call ``callback(sql)`` for every statement run by the writer."""
+        await self.start()
+        self._trace = callback
+        await self._db.set_trace_callback(callback)
+
+    async def run(self, job, label: str = None):
+        """Queue ``job`` and wait until the batch containing it is committed.
+
+        ``label`` names the job in the SQL metrics (default: its qualified name).
+        """
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        label = label or job.__qualname__.replace('.<locals>', '')
+        await self._queue.put((job, future, label))
+        return await future
+
+    async def execute(self, sql: str, params=()):
+        """Run one statement through the queue and return its ``lastrowid``."""
+        async def job(db):
+            cursor = await db.execute(sql, params)
+            return cursor.lastrowid
+        return await self.run(job, sql)
+
+    async def execute_rowcount(self, sql: str, params=()):
+        """Run one statement through the queue and return its ``rowcount``."""
+        async def job(db):
+            cursor = await db.execute(sql, params)
+            return cursor.rowcount
+        return await self.run(job, sql)
+
+    async def _next_batch(self):
+        first = await self._queue.get()
+        if first is None:
+            return None, True
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _loop(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                try:
+                    await self._commit(batch)
+                except BaseException:
+                    # cancelled mid-batch: nobody may be left waiting on it
+                    for _, future, _ in batch:
+                        future.cancel()
+                    self._task = None
+                    raise
+
+    async def _reconnect(self):
+        """Replace a write connection left in an unknown state."""
+        db, self._db = self._db, None
+        try:
+            await db.close()
+        except Exception:
+            pass
+        self._db = await self.pool.connect(isolation_level=None)
+        if self._trace is not None:
+            await self._db.set_trace_callback(self._trace)
+
+    async def _commit(self, batch):
+        outcomes = []
+        try:
+            if self._db is None:
+                await self._reconnect()
+            db = self._db
+            await db.execute("BEGIN IMMEDIATE")
+            for job, future, label in batch:
+                await db.execute("SAVEPOINT job")
+                start = time.perf_counter()
+                try:
+                    result = await job(db)
+                except Exception as e:
+                    observe_sql(label, time.perf_counter() - start)
+                    await db.execute("ROLLBACK TO job")
+                    await db.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+                else:
+                    observe_sql(label, time.perf_counter() - start)
+                    await db.execute("RELEASE job")
+                    outcomes.append((future, result, None))
+            start = time.perf_counter()
+            await db.execute("COMMIT")
+            observe_sql("COMMIT", time.perf_counter() - start)
+        except Exception as e:
+            outcomes = [(future, None, e) for _, future, _ in batch]
+            try:
+                if self._db.in_transaction:
+                    await self._db.execute("ROLLBACK")
+            except Exception:
+                logger.exception("Rolling back a write batch failed, reopening the write connection")
+                try:
+                    await self._reconnect()
+                except Exception:
+                    # retried by the next batch
+                    logger.exception("Reopening the write connection failed")
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
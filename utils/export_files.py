@@ -0,0 +1,106 @@
+"""Export file writers, run in the export worker processes.
+
+Every call is stateless: ``append_rows`` appends one chunk of rows to a
+part file and ``finish`` turns that part into the file that is sent, so
+chunks can go to any worker and memory use is bounded by the chunk size. CSV
+parts are the CSV itself; XLSX parts are the ``<sheetData>`` rows, zipped
+together with the fixed workbook parts at the end (no openpyxl needed).
+"""
+import csv
+import gzip
+import math
+import os
+import shutil
+import zipfile
+from xml.sax.saxutils import escape
+
+XLSX_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XLSX_DOC_RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{XLSX_RELS}">'
+        f'<Relationship Id="rId1" Type="{XLSX_DOC_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{XLSX_RELS}">'
+        f'<Relationship Id="rId1" Type="{XLSX_DOC_RELS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+# characters XML 1.0 does not allow, dropped from cell text
+XML_INVALID = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+
+
+def column_letter(index: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA."""
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def xlsx_cell(ref: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    text = escape(str(value).translate(XML_INVALID))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def append_rows(path: str, fmt: str, rows: list, first_row: int = 1):
+    """Append ``rows`` to the part file; ``first_row`` is the sheet row number of rows[0]."""
+    if fmt == 'csv':
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(rows)
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        for number, row in enumerate(rows, start=first_row):
+            cells = "".join(xlsx_cell(f"{column_letter(i)}{number}", value) for i, value in enumerate(row))
+            f.write(f'<row r="{number}">{cells}</row>')
+
+
+def finish(path: str, fmt: str, sheet: str, max_bytes: int = None) -> str:
+    """Turn the part file into the final export and return its path.
+
+    CSV files larger than ``max_bytes`` are gzipped; XLSX is compressed anyway.
+    """
+    if fmt == 'csv':
+        if max_bytes is None or os.path.getsize(path) <= max_bytes:
+            return path
+        with open(path, 'rb') as raw, gzip.open(path + '.gz', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.remove(path)
+        return path + '.gz'
+
+    target = os.path.splitext(path)[0] + '.xlsx'
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as book:
+        for name, xml in XLSX_PARTS.items():
+            book.writestr(name, xml)
+        book.writestr(
+            'xl/workbook.xml',
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{XLSX_MAIN}" xmlns:r="{XLSX_DOC_RELS}">'
+            f'<sheets><sheet name="{escape(sheet[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        )
+        with book.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as out, open(path, 'rb') as rows:
+            out.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="{XLSX_MAIN}"><sheetData>'.encode())
+            shutil.copyfileobj(rows, out, 1024 * 1024)
+            out.write(b'</sheetData></worksheet>')
+    os.remove(path)
+    return target
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from telegram.request import HTTPXRequest
+from utils.config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing is a bisect and two adds."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the max seen."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return 0.0
+
+
+class HistogramFamily:
+    """Histograms of one metric, one per label value."""
+
+    def __init__(self, name: str, label: str, help_text: str):
+        self.name = name
+        self.label = label
+        self.help_text = help_text
+        self.histograms = {}
+
+    def observe(self, label_value: str, seconds: float):
+        histogram = self.histograms.get(label_value)
+        if histogram is None:
+            histogram = self.histograms[label_value] = Histogram()
+        histogram.observe(seconds)
+
+    def top(self, n: int = 10, key=lambda h: h.sum):
+        return sorted(self.histograms.items(), key=lambda item: key(item[1]), reverse=True)[:n]
+
+
+handler_latency = HistogramFamily('bot_handler_seconds', 'handler', 'Time spent handling one update')
+sql_latency = HistogramFamily('bot_sql_seconds', 'statement', 'Time spent running one SQL statement or write job')
+telegram_latency = HistogramFamily('bot_telegram_api_seconds', 'method', 'Round trip of one Telegram Bot API call')
+
+FAMILIES = (handler_latency, sql_latency, telegram_latency)
+
+# most recent statements slower than SLOW_QUERY_MS
+slow_queries = deque(maxlen=50)
+
+# startup phase -> seconds it took, filled in by main.py
+startup_seconds = {}
+# command names and first callback data parts the bot handles, filled in by
+# Registry.add_to(); anything else is labelled unknown so users cannot add labels
+known_commands = set()
+known_callbacks = set()
+
+
+def statement_label(sql: str) -> str:
+    return " ".join(sql.split())[:200]
+
+
+def observe_sql(sql: str, seconds: float):
+    label = statement_label(sql)
+    sql_latency.observe(label, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.append((time.time(), seconds, label))
+        logger.warning("Slow query (%.1f ms): %s", seconds * 1000, label)
+
+
+def update_label(update) -> str:
+    """Name an update by what it triggers: /command, callback prefix, message, ..."""
+    message = getattr(update, 'message', None)
+    if message is not None and message.text:
+        if message.text.startswith('/'):
+            command = message.text.split()[0].split('@')[0][1:].lower()
+            return f"/{command}" if command in known_commands else 'command:unknown'
+        return 'message'
+    query = getattr(update, 'callback_query', None)
+    if query is not None and query.data:
+        prefix = query.data.split(':')[0]
+        return f"callback:{prefix}" if prefix in known_callbacks else 'callback:unknown'
+    if getattr(update, 'inline_query', None) is not None:
+        return 'inline_query'
+    if message is not None and message.document:
+        return 'document'
+    return 'other'
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest that records the round trip of every Bot API call."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            telegram_latency.observe(url.rsplit('/', 1)[-1], time.perf_counter() - start)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def render_prometheus(gauges: dict = None) -> str:
+    """All histograms (and optional gauges) in the Prometheus text format."""
+    lines = []
+    for family in FAMILIES:
+        lines.append(f"# HELP {family.name} {family.help_text}")
+        lines.append(f"# TYPE {family.name} histogram")
+        for label_value, histogram in family.histograms.items():
+            label = f'{family.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, histogram.counts):
+                cumulative += n
+                lines.append(f'{family.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{family.name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{family.name}_sum{{{label}}} {histogram.sum}")
+            lines.append(f"{family.name}_count{{{label}}} {histogram.count}")
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def render_stats(n: int = 8) -> str:
+    """Short human-readable summary for the /stats command."""
+    def fmt(label, h):
+        return (
+            f"• {label[:60]} — {h.count}× p50 {h.quantile(0.5) * 1000:.0f}ms "
+            f"p95 {h.quantile(0.95) * 1000:.0f}ms max {h.max * 1000:.0f}ms"
+        )
+
+    sections = [
+        ("⏱ Handlers (by total time)", handler_latency),
+        ("🗄 SQL (by total time)", sql_latency),
+        ("📡 Telegram API (by total time)", telegram_latency),
+    ]
+    lines = []
+    for title, family in sections:
+        lines.append(f"<b>{title}</b>")
+        lines.extend(_html(fmt(label, h)) for label, h in family.top(n))
+        if not family.histograms:
+            lines.append("• no data")
+        lines.append("")
+    lines.append(f"<b>🐢 Slow queries (≥ {SLOW_QUERY_MS:g} ms)</b>")
+    if slow_queries:
+        for _, seconds, label in list(slow_queries)[-5:]:
+            lines.append(_html(f"• {seconds * 1000:.0f}ms {label[:80]}"))
+    else:
+        lines.append("• none")
+    return "\n".join(lines)
+
+
+def _html(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def startup_report() -> str:
+    """One line with the startup phases recorded in ``startup_seconds``."""
+    phases = ", ".join(f"{phase.replace('_', ' ')} {seconds:.2f}s" for phase, seconds in startup_seconds.items())
+    return f"⏱ Startup: {phases}"
+
+
+async def export_periodically(path: str, interval: float, gauges=lambda: {}):
+    """Rewrite ``path`` with the Prometheus text every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(render_prometheus(gauges()))
+        os.replace(tmp_path, path)
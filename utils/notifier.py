@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+from utils.config import (
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_CHAT_RATE,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_DIGEST_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# below Telegram's 4096 character limit, leaving room for a header
+MESSAGE_MAX_CHARS = 3800
+
+
+def split_message(header: str, lines: list, limit: int = MESSAGE_MAX_CHARS) -> list:
+    """``header`` followed by ``lines``, as texts of at most ``limit`` characters each."""
+    texts, current = [], header
+    for line in lines:
+        if len(current) + 1 + len(line) > limit and current != header:
+            texts.append(current)
+            current = header
+        current += "\n" + line
+    texts.append(current)
+    return texts
+
+
+class TokenBucket:
+    """Rate limiter that hands out send slots (GCRA form of a token bucket).
+
+    ``reserve(at)`` books the earliest slot not before ``at`` and returns
+    it, so callers just sleep until their slot and messages keep their
+    booking order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.tat = 0.0  # theoretical arrival time of the next message
+
+    def reserve(self, at: float) -> float:
+        slot = max(at, self.tat - self.tolerance)
+        self.tat = max(self.tat, slot) + self.interval
+        return slot
+
+    def pause_until(self, at: float):
+        self.tat = max(self.tat, at + self.tolerance)
+
+
+class OutboundMessage:
+    __slots__ = ("chat_id", "text", "reply_markup", "kwargs", "attempts")
+
+    def __init__(self, chat_id, text: str, reply_markup=None, **kwargs):
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.kwargs = kwargs
+        self.attempts = 0
+
+
+class Notifier:
+    """Background queue for every bot-initiated message.
+
+    Handlers call ``enqueue()`` and return at once. A worker task sends
+    the messages within a global and a per-chat rate limit, retries on
+    RetryAfter (also pausing all sends) and on network errors with
+    exponential backoff, and drops messages Telegram refuses outright.
+    Messages enqueued with ``digest=True`` are held for ``digest_window``
+    seconds and sent to their chat merged, at most DIGEST_MAX_MESSAGES
+    and DIGEST_MAX_CHARS per message.
+    """
+
+    DIGEST_MAX_MESSAGES = 10
+    DIGEST_MAX_CHARS = MESSAGE_MAX_CHARS
+
+    def __init__(self, global_rate: float = 25, chat_rate: float = 1, max_retries: int = 5, digest_window: float = 0):
+        self.global_bucket = TokenBucket(global_rate, burst=max(1, int(global_rate)))
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.digest_window = digest_window
+        self.bot = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._queue = asyncio.Queue()
+        self._chat_buckets = {}
+        self._digests = {}
+        self._deliveries = set()
+        self._retrying = 0
+        self._worker = None
+
+    def start(self, bot):
+        self.bot = bot
+        self._worker = asyncio.create_task(self._run(), name="notifier")
+
+    async def stop(self, timeout: float = 10):
+        """Flush digests, then give queued, retrying and in-flight messages ``timeout`` seconds."""
+        if self._worker is None:
+            return
+        for chat_id in list(self._digests):
+            self._flush_digest(chat_id)
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Notifier stopped with %d undelivered messages",
+                self._queue.qsize() + len(self._deliveries) + self._retrying
+            )
+        self._worker.cancel()
+        for task in self._deliveries:
+            task.cancel()
+        self._worker = None
+
+    async def _drain(self):
+        while self._queue.qsize() or self._deliveries or self._retrying:
+            await asyncio.sleep(0.05)
+
+    def enqueue(self, chat_id, text: str, reply_markup=None, digest: bool = False, **kwargs):
+        """Queue a ``send_message`` call; never blocks the caller."""
+        message = OutboundMessage(chat_id, text, reply_markup, **kwargs)
+        if digest and self.digest_window > 0:
+            pending = self._digests.setdefault(chat_id, [])
+            pending.append(message)
+            if len(pending) == 1:
+                asyncio.get_running_loop().call_later(self.digest_window, self._flush_digest, chat_id)
+            return
+        self._queue.put_nowait(message)
+
+    def _flush_digest(self, chat_id):
+        chunk, length = [], 0
+        for message in self._digests.pop(chat_id, []):
+            if chunk and (len(chunk) == self.DIGEST_MAX_MESSAGES or length + len(message.text) > self.DIGEST_MAX_CHARS):
+                self._send_digest(chat_id, chunk)
+                chunk, length = [], 0
+            chunk.append(message)
+            # plus the blank line between merged messages
+            length += len(message.text) + 2
+        if chunk:
+            self._send_digest(chat_id, chunk)
+
+    def _send_digest(self, chat_id, chunk: list):
+        if len(chunk) == 1:
+            self._queue.put_nowait(chunk[0])
+            return
+        rows = []
+        for message in chunk:
+            if message.reply_markup:
+                rows.extend(message.reply_markup.inline_keyboard)
+        self._queue.put_nowait(OutboundMessage(
+            chat_id,
+            f"📬 {len(chunk)} new notifications\n\n" + "\n\n".join(message.text for message in chunk),
+            InlineKeyboardMarkup(rows) if rows else None,
+            **chunk[0].kwargs
+        ))
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        if len(self._chat_buckets) > 10000:
+            # forget chats whose bucket is idle again
+            self._chat_buckets = {key: bucket for key, bucket in self._chat_buckets.items() if bucket.tat > now}
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+        return bucket
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self._queue.get()
+            now = loop.time()
+            slot = self.global_bucket.reserve(self._chat_bucket(message.chat_id, now).reserve(now))
+            task = asyncio.create_task(self._deliver(message, slot - now))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, message: OutboundMessage, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await self.bot.send_message(
+                chat_id=message.chat_id,
+                text=message.text,
+                reply_markup=message.reply_markup,
+                **message.kwargs
+            )
+            self.sent += 1
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            self.global_bucket.pause_until(asyncio.get_running_loop().time() + retry_after)
+            self._retry(message, retry_after, e)
+        except BadRequest as e:
+            # BadRequest is a NetworkError subclass but retrying cannot fix it
+            self._drop(message, e)
+        except NetworkError as e:
+            self._retry(message, min(2 ** message.attempts, 60), e)
+        except TelegramError as e:
+            self._drop(message, e)
+
+    def _retry(self, message: OutboundMessage, delay: float, error: Exception):
+        message.attempts += 1
+        if message.attempts > self.max_retries:
+            return self._drop(message, error)
+        self.retried += 1
+        self._retrying += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, message)
+
+    def _requeue(self, message: OutboundMessage):
+        self._retrying -= 1
+        self._queue.put_nowait(message)
+
+    def _drop(self, message: OutboundMessage, error: Exception):
+        self.failed += 1
+        logger.warning("Dropping message to chat %s: %s", message.chat_id, error)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'in_flight': len(self._deliveries),
+            'sent': self.sent,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+
+notifier = Notifier(
+    global_rate=NOTIFY_GLOBAL_RATE,
+    chat_rate=NOTIFY_CHAT_RATE,
+    max_retries=NOTIFY_MAX_RETRIES,
+    digest_window=NOTIFY_DIGEST_SECONDS
+)
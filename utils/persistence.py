@@ -0,0 +1,130 @@
+import json
+from telegram.ext import BasePersistence, PersistenceInput
+from utils.database.base import tenants
+from utils.database.tenant import DEFAULT_TENANT, TenantPool, TenantWriter
+
+# persisted state lives in the default database whichever tenant an update belongs to
+pool = TenantPool(tenants, DEFAULT_TENANT)
+writer = TenantWriter(tenants, DEFAULT_TENANT)
+
+
+class SqlitePersistence(BasePersistence):
+    """Keeps ``user_data`` and ConversationHandler states in the bot database.
+
+    Every user and every conversation is its own row, so a flush writes
+    only the entries whose serialised value changed since it was last
+    written, and rows are deleted as soon as they are empty or the
+    conversation ends. ``user_data`` is loaded lazily the first time a
+    user shows up (``refresh_user_data``) and only active conversations
+    are loaded at startup, so the cost follows active users rather than
+    every user ever seen. Chat, bot and callback data are not used by
+    this bot and are not stored.
+    """
+
+    def __init__(self, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._loaded_users = set()
+        # last serialised value written per user / conversation key
+        self._written_users = {}
+        self._written_conversations = {}
+
+    # user_data
+
+    async def get_user_data(self) -> dict:
+        # loaded per user in refresh_user_data()
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        row = await pool.fetchone("SELECT data FROM persisted_user_data WHERE user_id=?", (user_id,))
+        if row is None:
+            return
+        self._written_users[user_id] = row[0]
+        for key, value in json.loads(row[0]).items():
+            user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if not data:
+            return await self.drop_user_data(user_id)
+        serialised = json.dumps(data, sort_keys=True)
+        if self._written_users.get(user_id) == serialised:
+            return
+        await writer.execute(
+            "INSERT INTO persisted_user_data (user_id, data) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET data=excluded.data",
+            (user_id, serialised)
+        )
+        self._written_users[user_id] = serialised
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self._written_users.pop(user_id, None) is None and user_id in self._loaded_users:
+            # nothing was ever stored for this user
+            return
+        await writer.execute("DELETE FROM persisted_user_data WHERE user_id=?", (user_id,))
+
+    # conversations
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await pool.fetchall("SELECT key, state FROM persisted_conversation WHERE name=?", (name,))
+        conversations = {}
+        for key, state in rows:
+            self._written_conversations[(name, key)] = state
+            conversations[tuple(json.loads(key))] = json.loads(state)
+        return conversations
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        db_key = json.dumps(list(key))
+        if new_state is None:
+            if self._written_conversations.pop((name, db_key), None) is not None:
+                await writer.execute(
+                    "DELETE FROM persisted_conversation WHERE name=? AND key=?",
+                    (name, db_key)
+                )
+            return
+        state = json.dumps(new_state)
+        if self._written_conversations.get((name, db_key)) == state:
+            return
+        await writer.execute(
+            "INSERT INTO persisted_conversation (name, key, state) VALUES (?, ?, ?) "
+            "ON CONFLICT(name, key) DO UPDATE SET state=excluded.state",
+            (name, db_key, state)
+        )
+        self._written_conversations[(name, db_key)] = state
+
+    # unused stores
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # every update is written through the write queue as it happens
+        pass
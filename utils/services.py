@@ -0,0 +1,132 @@
+from functools import cached_property
+from utils.config import (
+    LOOKUP_CACHE_SIZE,
+    LOOKUP_CACHE_TTL,
+    DECISION_CACHE_SIZE,
+    BACKUP_DIR,
+    BACKUP_KEEP,
+    BACKUP_COMPRESS,
+    BACKUP_STEP_PAGES,
+    BACKUP_STEP_SLEEP_MS
+)
+from utils.database import (
+    AdminDbService,
+    BackupService,
+    ClientDbService,
+    LedgerDbService,
+    NutDbService,
+    ReportDbService,
+    RequestDbService,
+    table_cache,
+    tenants
+)
+from utils.command import (
+    AdminCommands,
+    BackupCommands,
+    ClientCommands,
+    ExportCommands,
+    ImportCommands,
+    InlineCommands,
+    NutCommands,
+    ReportCommands,
+    RequestCommands
+)
+from utils import ui_helper
+
+
+class Services:
+    """Every db service and command group of the bot, each built once on first use.
+
+    Command groups that touch the same table share one db service, and so
+    one lookup cache, instead of each building their own. Nothing here
+    opens a connection: the services all borrow from the pool that
+    ``init_db`` opens.
+    """
+
+    # db services
+
+    @cached_property
+    def clients_db(self) -> ClientDbService:
+        return ClientDbService('client')
+
+    @cached_property
+    def nuts_db(self) -> NutDbService:
+        # admins and nuts are small reference tables looked up on every
+        # request, so they are read through the shared table caches
+        return NutDbService('nut', cache=table_cache('nut', LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL or None))
+
+    @cached_property
+    def admins_db(self) -> AdminDbService:
+        return AdminDbService('admin', cache=table_cache('admin', LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL or None))
+
+    @cached_property
+    def requests_db(self) -> RequestDbService:
+        return RequestDbService('request', decisions=table_cache('request_decision', DECISION_CACHE_SIZE))
+
+    @cached_property
+    def ledger_db(self) -> LedgerDbService:
+        return LedgerDbService()
+
+    @cached_property
+    def report_db(self) -> ReportDbService:
+        return ReportDbService()
+
+    @cached_property
+    def backups(self) -> BackupService:
+        return BackupService(
+            tenants,
+            BACKUP_DIR,
+            keep=BACKUP_KEEP,
+            compress=BACKUP_COMPRESS,
+            pages=BACKUP_STEP_PAGES,
+            step_sleep=BACKUP_STEP_SLEEP_MS / 1000
+        )
+
+    # command groups
+
+    @cached_property
+    def client_cmds(self) -> ClientCommands:
+        return ClientCommands(self.clients_db, self.ledger_db)
+
+    @cached_property
+    def nut_cmds(self) -> NutCommands:
+        return NutCommands(self.nuts_db)
+
+    @cached_property
+    def admin_cmds(self) -> AdminCommands:
+        return AdminCommands(self.admins_db)
+
+    @cached_property
+    def request_cmds(self) -> RequestCommands:
+        return RequestCommands(self.requests_db, self.nuts_db, self.admins_db)
+
+    @cached_property
+    def report_cmds(self) -> ReportCommands:
+        return ReportCommands(self.report_db)
+
+    @cached_property
+    def inline_cmds(self) -> InlineCommands:
+        return InlineCommands(self.nuts_db, self.clients_db, self.admins_db)
+
+    @cached_property
+    def import_cmds(self) -> ImportCommands:
+        return ImportCommands({'client': self.clients_db, 'nut': self.nuts_db})
+
+    @cached_property
+    def backup_cmds(self) -> BackupCommands:
+        return BackupCommands(self.backups)
+
+    @cached_property
+    def export_cmds(self) -> ExportCommands:
+        return ExportCommands({'requests': self.requests_db, 'clients': self.clients_db, 'nuts': self.nuts_db})
+
+    def command_groups(self) -> tuple:
+        """Command groups in help order; ui_helper closes the list."""
+        return (
+            self.client_cmds, self.nut_cmds, self.admin_cmds, self.request_cmds,
+            self.report_cmds, self.inline_cmds, self.import_cmds, self.export_cmds,
+            self.backup_cmds, ui_helper
+        )
+
+
+services = Services()
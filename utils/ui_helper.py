@@ -1,121 +1,62 @@
-from telegram import Update,InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import Application, CommandHandler, ContextTypes,CallbackQueryHandler
-from utils.database import (
-    BaseDbService as AdminDbService,
-    ClientDbService,
-    NutDbService,
-    RequestDbService
-)
-
-from utils.command import (
-    ClientCommands,
-    AdminCommands,
-    NutCommands,
-    RequestCommands
-)
-
-# initialisations:
-client_cmds = ClientCommands(ClientDbService('client'))
-admin_cmds = AdminCommands(AdminDbService('admin'))
-nut_cmds = NutCommands(NutDbService('nut'))
-request_cmds = RequestCommands(RequestDbService('request'))
-
-
-HELP_TEXT_HTML = """
-<b>🧭 Available Commands</b>
-
-👤 <b>Client Commands</b>
-• <code>/start</code> — Start the bot and receive a welcome message
-• <code>/add_client &lt;name&gt; [credit]</code> — Add a new client (optional starting credit)
-• <code>/list_clients</code> — View all clients
-• <code>/update_credit &lt;client_name&gt; &lt;amount&gt;</code> — Update a client's credit balance
-
-🥜 <b>Nut Commands</b>
-• <code>/add_nut &lt;nut_name&gt; [packages]</code> — Add a new type of nut (optional package count)
-• <code>/list_nuts</code> — View all nut types
-
-🧑‍💼 <b>Admin Commands</b>
-• <code>/add_admin &lt;admin_name&gt;</code> — Add a new admin
-• <code>/list_admins</code> — View all admins
-
-📦 <b>Request Commands</b>
-• <code>/add_request &lt;nut_name&gt; &lt;packages&gt; &lt;credit_paid&gt; [description]</code> — Record a new request
-• <code>/list_requests</code> — View all requests
-
-💡 <b>Example Usage:</b>
-• <code>/add_client John 500</code> — Adds a client named John with 500 credit
-"""
-
-
-
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-
-    if data == "add_client":
-        await query.edit_message_text("Use `/add_client <name> [credit]`", parse_mode="Markdown")
-    elif data == "list_clients":
-        await client_cmds.list_cmd(update, context)
-    elif data == "update_credit":
-        await query.edit_message_text("Use `/update_credit <client_name> <amount>`", parse_mode="Markdown")
-    elif data == "add_nut":
-        await query.edit_message_text("Use `/add_nut <nut_name> [packages]`", parse_mode="Markdown")
-    elif data == "list_nuts":
-        await nut_cmds.list_cmd(update, context)
-    elif data == "add_admin":
-        await query.edit_message_text("Use `/add_admin <admin_name>`", parse_mode="Markdown")
-    elif data == "list_admins":
-        await admin_cmds.list_cmd(update, context)
-    elif data == "add_request":
-        await query.edit_message_text("Use `/add_request <nut_name> <packages> <credit_paid> [description]`", parse_mode="Markdown")
-    elif data.startswith("request:"):
-        # delegate approve/reject callbacks to request command handler
-        await request_cmds.handle_request_decision(update, context)
-    elif data == "list_requests":
-        await request_cmds.list_cmd(update, context)
-    elif data == "help":
-        await help_cmd(update, context)
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.config import MAIN_ADMIN_ID
+from utils.database import cache_stats, tenants
+from utils.command import registry
+from utils.metrics import render_stats, startup_seconds
+from utils.notifier import notifier
+from utils.update_processor import update_processor
+
+
+def register(registry):
+    """General commands; registered after the command groups so they close the help."""
+    registry.section("ℹ️ <b>General</b>")
+    registry.command("start", start, help="Start the bot and receive a welcome message")
+    registry.command("help", help_cmd, help="Show this list of commands")
+    registry.callback("help", help_cmd)
+    registry.button("❓ Help", "help")
+    registry.section("📊 <b>Monitoring</b>")
+    registry.command("stats", stats_cmd, help="Handler, SQL and Telegram API latency, caches and queues (main admin)")
 
 
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.message.reply_text(
-        HELP_TEXT_HTML,
+    await update.effective_message.reply_text(
+        registry.help_html(),
         parse_mode="HTML"
     )
 
 
+def runtime_gauges() -> dict:
+    """Point-in-time numbers shown by /stats and written to the metrics file."""
+    gauges = {f"bot_notifier_{key}": value for key, value in notifier.stats().items()}
+    depths = update_processor.queue_depths()
+    gauges['bot_updates_pending'] = sum(depths.values())
+    gauges['bot_busy_chats'] = len(depths)
+    for key, value in tenants.stats().items():
+        gauges[f"bot_tenants_{key}"] = value
+    for phase, seconds in startup_seconds.items():
+        gauges[f"bot_startup_{phase}_seconds"] = seconds
+    for table, stats in cache_stats().items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                gauges[f"bot_cache_{table}_{key}"] = value
+    return gauges
+
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_user.id) != str(MAIN_ADMIN_ID):
+        return await update.message.reply_text("❌ Only the main admin can see stats.")
+    gauges = "\n".join(f"• {name[4:]}: {value:g}" for name, value in runtime_gauges().items())
+    await update.message.reply_text(
+        render_stats() + "\n\n<b>📈 Queues and caches</b>\n" + gauges,
+        parse_mode="HTML"
+    )
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [
-            InlineKeyboardButton("➕ Add Client", callback_data="add_client"),
-            InlineKeyboardButton("📋 List Clients", callback_data="list_clients")
-        ],
-        [
-            InlineKeyboardButton("💸 Update Credit", callback_data="update_credit"),
-            InlineKeyboardButton("🥜 Add Nut", callback_data="add_nut")
-        ],
-        [
-            InlineKeyboardButton("📦 List Nuts", callback_data="list_nuts"),
-            InlineKeyboardButton("🧑‍💼 Add Admin", callback_data="add_admin")
-        ],
-        [
-            InlineKeyboardButton("📋 List Admins", callback_data="list_admins"),
-            InlineKeyboardButton(" Add Request", callback_data="add_request")
-        ],
-        [
-            InlineKeyboardButton("📜 List Requests", callback_data="list_requests"),
-            InlineKeyboardButton("❓ Help", callback_data="help")
-        ]
-    ]
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🥜 Welcome to the Nuts Credit Manager Bot!\n\n")
     await update.message.reply_text(
-        HELP_TEXT_HTML+'\n\nChoose a command:',
-        reply_markup=reply_markup,
+        registry.help_html()+'\n\nChoose a command:',
+        reply_markup=registry.start_keyboard(),
         parse_mode="HTML"
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from utils.config import MAX_CONCURRENT_UPDATES, MAIN_ADMIN_ID
+from utils.database import DEFAULT_TENANT, current_tenant, tenants, untag
+from utils.metrics import handler_latency, update_label
+
+
+class ChatQueue:
+    """Lock serialising one chat's updates plus the number waiting on it."""
+
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different chats concurrently, each chat in order.
+
+    At most ``max_concurrent_updates`` handlers run at once. Updates that
+    share a chat wait on that chat's lock (asyncio locks are FIFO) so the
+    ConversationHandler flows see their messages strictly in arrival
+    order. The chat lock is taken before a running slot, so a busy chat
+    never holds slots that other chats could use; ``max_pending`` only
+    bounds how many updates may be waiting in total. Each update runs with
+    its tenant set (see tenant_of), which picks the database it uses.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending: int = 10000):
+        super().__init__(max(max_pending, max_concurrent_updates))
+        self.running_limit = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chats = {}
+
+    @staticmethod
+    def chat_key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        # inline queries and the like have no chat, order them per user
+        if update.effective_user:
+            return f"user:{update.effective_user.id}"
+        return None
+
+    @staticmethod
+    def tenant_of(update: object) -> str:
+        if not isinstance(update, Update):
+            return DEFAULT_TENANT
+        chat, user = update.effective_chat, update.effective_user
+        query = update.callback_query
+        if query and query.data and user and str(user.id) == str(MAIN_ADMIN_ID):
+            # buttons sent to the main admin on behalf of a tenant name it
+            _, tenant = untag(query.data)
+            if tenant is not None:
+                return tenant
+        return tenants.resolve(
+            chat.id if chat else None,
+            user.id if user else None,
+            group=bool(chat and chat.type != 'private')
+        )
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        token = current_tenant.set(self.tenant_of(update))
+        try:
+            await self._process_in_order(update, coroutine)
+        finally:
+            current_tenant.reset(token)
+
+    async def _process_in_order(self, update: object, coroutine) -> None:
+        key = self.chat_key(update)
+        if key is None:
+            async with self._running:
+                await self._timed(update, coroutine)
+            return
+
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = ChatQueue()
+        chat.depth += 1
+        try:
+            async with chat.lock:
+                async with self._running:
+                    await self._timed(update, coroutine)
+        finally:
+            chat.depth -= 1
+            if chat.depth == 0:
+                del self._chats[key]
+
+    @staticmethod
+    async def _timed(update: object, coroutine):
+        # time spent in the handlers only, not waiting for the chat or a slot
+        start = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            handler_latency.observe(update_label(update), time.perf_counter() - start)
+
+    def queue_depths(self) -> dict:
+        """Updates queued or running per chat, for chats that have any."""
+        return {key: chat.depth for key, chat in self._chats.items()}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+update_processor = ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES)